@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+""" measures the startup cost of the module - how long `import crowdstrike` takes,
+    how long it takes to construct a client in lazy_auth mode, and how long the first
+    endpoint access and session creation take
+
+    each measurement is taken in a fresh interpreter, so nothing's cached in sys.modules
+
+    usage: python bench_startup.py [runs]
+"""
+
+import statistics
+import subprocess
+import sys
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+BENCHMARKS = {
+    'import crowdstrike' : (
+        "import crowdstrike",
+        "",
+    ),
+    'construct (lazy_auth=True)' : (
+        "from crowdstrike import CrowdstrikeAPI",
+        "CrowdstrikeAPI('client_id', 'client_secret', lazy_auth=True)",
+    ),
+    'first endpoint access' : (
+        "from crowdstrike import CrowdstrikeAPI; api = CrowdstrikeAPI('client_id', 'client_secret', lazy_auth=True)",
+        "api.hosts_detail",
+    ),
+    'session creation (requests/oauthlib import)' : (
+        "from crowdstrike import CrowdstrikeAPI; api = CrowdstrikeAPI('client_id', 'client_secret', lazy_auth=True)",
+        "api.oauth",
+    ),
+}
+
+TIMER = """
+import time
+{setup_before}
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+def run_benchmark(setup: str, statement: str) -> float:
+    """ runs the statement in a fresh interpreter, returns the elapsed seconds """
+    if statement:
+        code = TIMER.format(setup_before=setup, statement=statement)
+    else:
+        # timing the setup itself
+        code = TIMER.format(setup_before="", statement=setup)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, check=True, text=True)
+    return float(result.stdout.strip())
+
+def main():
+    """ runs all the benchmarks and prints a table """
+    print(f"{'benchmark':<45} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for name, (setup, statement) in BENCHMARKS.items():
+        timings = [run_benchmark(setup, statement) * 1000 for _ in range(RUNS)]
+        print(f"{name:<45} {statistics.median(timings):>10.2f} {min(timings):>10.2f} {max(timings):>10.2f}")
+
+if __name__ == '__main__':
+    main()
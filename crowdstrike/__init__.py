@@ -5,45 +5,36 @@ Crowdstrike API module
 
 import json
 import os
-import sys
+import threading
 import time
 import errno
 
-try:
-    from loguru import logger
-    import requests
-    from requests.auth import HTTPBasicAuth
-
-    import requests_oauthlib
-    from oauthlib.oauth2 import BackendApplicationClient, TokenExpiredError
-except ImportError as importerror:
-    sys.exit(f"Failed to import a dependency, quitting. Error: {importerror}")
-
-from .hosts import hosts_query_devices, host_action, hosts_hidden, hosts_detail
-from .hostgroup import search_host_groups, get_host_groups, update_host_group, create_host_group, delete_host_groups
-from .sensor_download import get_sensor_installer_details, get_ccid, get_latest_sensor_id, get_sensor_installer_ids, download_sensor
-from .event_streams import get_event_streams
-from .incidents import incidents_behaviors_by_id, incidents_get_crowdscores, incidents_get_details, incidents_perform_actions, incidents_query, incidents_query_behaviors
-from .detects import get_detects, get_detections
-from .rtr import create_rtr_session, delete_rtr_session, rtr_execute_command, rtr_command_status, rtr_command_status_wait, list_rtr_session_ids
-from .rtr_admin import search_rtr_scripts, get_rtr_scripts
-
-from .intel import *
-try:
-    if isinstance(THIS_SHOULD_FAIL, bool):
-        raise ValueError("__all__ is missing in a module")
-except ValueError:
-    logger.error("__all__ is missing in a module")
-    sys.exit(1)
-except NameError:
-    # this is good
-    pass
+from loguru import logger
+
+# requests and oauthlib are only imported when the first request's made, so importing this module
+# (and constructing a client with lazy_auth=True) stays cheap for short-lived scripts
+from .utilities import LazyEndpoint, lazy_import_endpoint, ENDPOINT_MODULES
+from .ratelimit import RateLimiter
+from .token_cache import TokenCache
+from .retry import RetryPolicy
+from .cache import ResponseCache
 
 API_BASEURL = "https://api.crowdstrike.com"
 
 # if you want to enable logging then you can just run logger.enable("crowdstrike") in your code.
 logger.disable('crowdstrike')
 
+# refresh the token this many seconds before it's due to expire
+TOKEN_REFRESH_MARGIN = 60
+
+# connection pool defaults, pool_connections is the number of hosts to keep pools for,
+# pool_maxsize is the number of connections kept alive per host - size it to your thread count
+DEFAULT_POOL_CONNECTIONS = 2
+DEFAULT_POOL_MAXSIZE = 10
+
+# how many times a request will be replayed after a 429 before giving the response back to the caller
+MAX_RATE_LIMIT_RETRIES = 5
+
 # set status by using the keys in here, not the values
 INCIDENT_STATUS_LOOKUP = {
     20 : "New",
@@ -67,33 +58,172 @@ class CrowdstrikeAPI:
     def __init__(self,
                  client_id: str,
                  client_secret: str,
-                 api_baseurl: str = API_BASEURL):
+                 api_baseurl: str = API_BASEURL,
+                 rate_limiter: RateLimiter = None,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 pool_block: bool = False,
+                 keep_alive: bool = True,
+                 lazy_auth: bool = False,
+                 token_cache: TokenCache = None,
+                 retry_policy: RetryPolicy = None,
+                 response_cache: ResponseCache = None,
+                 ):
         """ Starts up the CrowdstrikeAPI module Needs two strings,
         the client_id and client_secret, available from
         https://falcon.crowdstrike.com/support/api-clients-and-keys
 
         You might want to override api_baseurl if you're in a different region, too.
+
+        rate_limiter is a RateLimiter instance, pass your own if you want to share
+        one between clients using the same API key, or tune the burst size.
+
+        The client is safe to share between threads. Connection pool settings:
+        - pool_connections (int) - the number of hosts to keep connection pools for
+        - pool_maxsize (int) - the number of connections to keep alive, set this to the number of threads you're using
+        - pool_block (bool) - if True, threads wait for a free connection instead of opening (and discarding) extra ones
+        - keep_alive (bool) - set to False to close the connection after every request
+
+        If lazy_auth is True, the token isn't fetched until the first request's made.
+
+        token_cache is a TokenCache instance, if it's set then tokens are shared on-disk
+        with other processes using the same client_id and api_baseurl.
+
+        retry_policy is a RetryPolicy instance, it controls timeouts and when failed requests
+        are replayed. Use RetryPolicy(max_retries=0) to turn retries off.
+
+        response_cache is a ResponseCache instance, if it's set then responses from the
+        read-mostly entity endpoints are cached. It's off by default.
         """
         self.client_id = client_id
         self.client_secret = client_secret
-        self.client = BackendApplicationClient(client_id=client_id)
-        self.oauth = requests_oauthlib.OAuth2Session(client=self.client)
-        #grab a token to start with
-        self.token = self.get_token()
+        # the token is shared between threads, it's only replaced (never modified) while holding this lock
+        # and only one thread gets to fetch a new one at a time, see refresh_token()
+        self.token_lock = threading.RLock()
+        self.token = None
+        # these are set up on first use, see the oauth property
+        self.client = None
+        self._oauth = None
+        self.configure_connection_pool(pool_connections=pool_connections,
+                                       pool_maxsize=pool_maxsize,
+                                       pool_block=pool_block,
+                                       keep_alive=keep_alive,
+                                       )
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.token_cache = token_cache
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.response_cache = response_cache
         self.api_baseurl = api_baseurl
+        if not lazy_auth:
+            #grab a token to start with
+            self.token = self.get_token()
 
-    def get_token(self):
-        """ Gets the latest auth token and returns it. """
-        logger.debug("Requesting auth token")
+    @property
+    def oauth(self):
+        """ the pooled OAuth2Session, created the first time it's needed """
+        if self._oauth is None:
+            with self.token_lock:
+                if self._oauth is None:
+                    import requests_oauthlib # pylint: disable=import-outside-toplevel
+                    from oauthlib.oauth2 import BackendApplicationClient # pylint: disable=import-outside-toplevel
+                    self.client = BackendApplicationClient(client_id=self.client_id)
+                    session = requests_oauthlib.OAuth2Session(client=self.client)
+                    self._mount_connection_pool(session)
+                    self._oauth = session
+        return self._oauth
+
+    def configure_connection_pool(self,
+                                  pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                                  pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                                  pool_block: bool = False,
+                                  keep_alive: bool = True,
+                                  ):
+        """ (re)sizes the connection pool used for the API, see __init__() for the arguments """
+        if pool_connections < 1 or pool_maxsize < 1:
+            raise ValueError("pool_connections and pool_maxsize need to be at least 1")
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        if self._oauth is not None:
+            self._mount_connection_pool(self._oauth)
+
+    def _mount_connection_pool(self, session):
+        """ applies the connection pool settings to the session """
+        from requests.adapters import HTTPAdapter # pylint: disable=import-outside-toplevel
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block,
+                              )
+        session.mount('https://', adapter)
+        if self.keep_alive:
+            session.headers.pop('Connection', None)
+        else:
+            session.headers['Connection'] = 'close'
+
+    def get_token(self, stale_token: dict = None):
+        """ Gets the latest auth token and returns it.
+
+        If there's a token_cache, a valid cached token is used instead of fetching a new one,
+        unless it's stale_token (ie, the one that just got rejected).
+        """
         uri = '/oauth2/token'
         # this is just here for introspection purposes
         # pylint: disable=unused-variable
         method = 'post'
-        self.token = self.oauth.fetch_token(
-            token_url=f"{API_BASEURL}{uri}",
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-        )
+        if self.token_cache is None:
+            return self._fetch_token(f"{self.api_baseurl}{uri}")
+        with self.token_lock, self.token_cache.lock(self.client_id, self.api_baseurl):
+            cached = self.token_cache.load(self.client_id, self.api_baseurl, min_ttl=TOKEN_REFRESH_MARGIN)
+            if cached and (not stale_token or cached.get('access_token') != stale_token.get('access_token')):
+                logger.debug("Using cached auth token")
+                self.token = cached
+                return self.token
+            token = self._fetch_token(f"{self.api_baseurl}{uri}")
+            self.token_cache.store(self.client_id, self.api_baseurl, token)
+        return token
+
+    def _fetch_token(self, token_url: str):
+        """ requests a new token from the API """
+        logger.debug("Requesting auth token")
+        with self.token_lock:
+            self.token = self.oauth.fetch_token(
+                token_url=token_url,
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+            )
+        return self.token
+
+    def token_needs_refresh(self, token: dict = None) -> bool:
+        """ returns True if the token is missing or within TOKEN_REFRESH_MARGIN seconds of expiring """
+        if token is None:
+            token = self.token
+        if not token:
+            return True
+        # oauthlib turns expires_in into an absolute expires_at when it parses the token response
+        expires_at = token.get('expires_at')
+        if expires_at is None:
+            return False
+        return time.time() >= float(expires_at) - TOKEN_REFRESH_MARGIN
+
+    def refresh_token(self, stale_token: dict = None):
+        """ single-flight token refresh
+
+        Only one thread fetches a new token, any others that saw the same stale token
+        wait on the lock and then use the one it fetched.
+        """
+        with self.token_lock:
+            if self.token is not stale_token and not self.token_needs_refresh():
+                logger.debug("Token was refreshed by another thread")
+                return self.token
+            return self.get_token(stale_token=stale_token)
+
+    def ensure_token(self):
+        """ refreshes the token ahead of time if it's close to expiring """
+        token = self.token
+        if self.token_needs_refresh(token):
+            logger.debug("Token's due to expire, refreshing it")
+            self.refresh_token(token)
         return self.token
 
     def revoke_token(self, **kwargs):
@@ -103,38 +233,57 @@ class CrowdstrikeAPI:
         """
         #token = kwargs.get('token', self.token)
         #logger.debug(self.token)
-        token = kwargs.get('token', self.token.get('access_token'))
+        current_token = self.token.get('access_token') if self.token else None
+        token = kwargs.get('token', current_token)
 
         uri = '/oauth2/revoke'
         method = 'post'
         data = {
             'token': token,
         }
-        response = requests.request(url=f"{API_BASEURL}{uri}",
-                                    method=method,
-                                    data=data,
-                                    auth=HTTPBasicAuth(self.client_id, self.client_secret)
-                                    )
+        from requests.auth import HTTPBasicAuth # pylint: disable=import-outside-toplevel
+        # this goes over the pooled session, but authenticates with the client credentials instead of the token
+        response = self.oauth.request(method,
+                                      f"{self.api_baseurl}{uri}",
+                                      data=data,
+                                      auth=HTTPBasicAuth(self.client_id, self.client_secret),
+                                      withhold_token=True,
+                                      )
+        if token == current_token:
+            with self.token_lock:
+                if self.token and self.token.get('access_token') == token:
+                    # it's no good now, the next request will fetch a new one
+                    self.token = None
+                    if self.token_cache is not None:
+                        self.token_cache.delete(self.client_id, self.api_baseurl)
         logger.debug(response)
         logger.debug(response.request.headers)
         logger.debug(response.request.body)
         return response.json()
 
-    def do_request(self, uri: str, data: dict, request_method: str = 'get'):
+    def do_request(self, uri: str, data: dict, request_method: str = 'get', token: dict = None, timeout: float = None):
         """ does the request, this allows a single code implementation for
             the duplicated calls in self.request()
 
             default request method is get
+
+            the token is passed in as a header rather than read from the session's
+            oauth client, so threads never see a token that's halfway through being replaced
         """
-        fulluri = f"{API_BASEURL}{uri}"
+        fulluri = f"{self.api_baseurl}{uri}"
+        if token is None:
+            token = self.token
+        headers = {
+            'Authorization' : f"Bearer {token.get('access_token')}",
+        }
 
         # these methods use a get-request-style-data-in-the-url nastiness.
         methods_using_params = ['get', 'delete']
 
         if request_method.lower() in methods_using_params and data:
-            response = self.oauth.request(request_method, fulluri, params=data)
+            response = self.oauth.request(request_method, fulluri, params=data, headers=headers, withhold_token=True, timeout=timeout)
         else:
-            response = self.oauth.request(request_method, fulluri, json=data)
+            response = self.oauth.request(request_method, fulluri, json=data, headers=headers, withhold_token=True, timeout=timeout)
         return response
 
     def request(self, uri: str, request_method: str = None, data: dict = None):
@@ -143,72 +292,146 @@ class CrowdstrikeAPI:
         request_method is a string, either get / post / delete etc
             default is set in self.do_request()
         """
-        # TODO: handle rate limiting
-        # Requests will return the following headers:
-        # X-RateLimit-Limit : Request limit per minute.
-        #   type = integer
-        # X-RateLimit-Remaining : The number of requests remaining for the sliding 1 minute window.
-        #   type = integer
         logger.debug(f"request(uri='{uri}', request_method='{request_method}', data='{data}'")
-        try:
-            req = self.do_request(uri=uri,
-                                  request_method=request_method,
-                                  data=data,
-                                  )
-        except TokenExpiredError:
-            logger.debug("Token's expired, grabbing a new one")
-            self.token = self.get_token()
-            req = self.do_request(uri=uri,
-                                  request_method=request_method,
-                                  data=data,
-                                 )
-            req.raise_for_status()
+        if self.response_cache is None:
+            return self._send(uri=uri, request_method=request_method, data=data)
+
+        cached = self.response_cache.get(request_method,
+                                         uri,
+                                         data,
+                                         revalidate=lambda: self._send(uri=uri, request_method=request_method, data=data),
+                                         )
+        if cached is not None:
+            logger.debug(f"Using cached response for {uri}")
+            return cached
+        # an invalidation while this is in flight means the response could already be out of date
+        generation = self.response_cache.generation
+        req = self._send(uri=uri, request_method=request_method, data=data)
+        self.response_cache.store(request_method, uri, data, req, generation=generation)
+        self.response_cache.invalidate(request_method, uri, data)
         return req
 
+    def _send(self, uri: str, request_method: str = None, data: dict = None):
+        """ sends the request, handling the token, rate limiting and retries """
+        from requests.exceptions import RequestException # pylint: disable=import-outside-toplevel
+        rate_limit_retries = 0
+        retries = 0
+        waited = 0.0
+        started = time.monotonic()
+        while True:
+            token = self.ensure_token()
+            waited += self.rate_limiter.acquire()
+            if waited:
+                logger.debug(f"Waited {waited:.3f}s for the rate limiter")
+            try:
+                req = self.do_request(uri=uri,
+                                      request_method=request_method,
+                                      data=data,
+                                      token=token,
+                                      timeout=self.retry_policy.timeout(started),
+                                      )
+                if req.status_code == 401:
+                    logger.debug("Token's expired, grabbing a new one")
+                    token = self.refresh_token(token)
+                    req = self.do_request(uri=uri,
+                                          request_method=request_method,
+                                          data=data,
+                                          token=token,
+                                          timeout=self.retry_policy.timeout(started),
+                                         )
+                    req.raise_for_status()
+            except RequestException as error:
+                if getattr(error, 'response', None) is not None:
+                    # raise_for_status() after the token refresh, that's not something to retry
+                    raise
+                backoff = self.retry_policy.retry_error(request_method, uri, error, retries, started)
+                if backoff is None:
+                    raise
+                retries += 1
+                time.sleep(backoff)
+                continue
+            self.rate_limiter.update(req.headers)
+            if req.status_code == 429 and rate_limit_retries < MAX_RATE_LIMIT_RETRIES:
+                delay = self.rate_limiter.backoff(req.headers)
+                # the wait happens in the rate limiter on the next go around, if it'd run past the deadline the 429's returned
+                if self.retry_policy.retry_rate_limited(request_method, uri, delay, started):
+                    rate_limit_retries += 1
+                    continue
+            backoff = self.retry_policy.retry_response(request_method, uri, req.status_code, retries, started)
+            if backoff is None:
+                break
+            retries += 1
+            time.sleep(backoff)
+        # so callers working with the raw response can see how long the rate limiter held them up,
+        # and how many times the request was retried
+        req.rate_limit_wait = waited
+        req.retries = retries
+        return req
+
+    # endpoints are imported from their modules the first time they're used, see utilities.LazyEndpoint
     # sensor-related things
-    get_ccid = get_ccid
-    get_latest_sensor_id = get_latest_sensor_id
-    get_sensor_installer_details = get_sensor_installer_details
-    get_sensor_installer_ids = get_sensor_installer_ids
-    download_sensor = download_sensor
+    get_ccid = LazyEndpoint()
+    get_latest_sensor_id = LazyEndpoint()
+    get_sensor_installer_details = LazyEndpoint()
+    get_sensor_installer_ids = LazyEndpoint()
+    download_sensor = LazyEndpoint()
     #detects
-    get_detects = get_detects
-    get_detections = get_detections
+    get_detects = LazyEndpoint()
+    get_detections = LazyEndpoint()
+    backfill_detects = LazyEndpoint()
+    get_detects_aggregates = LazyEndpoint()
+    update_detection = LazyEndpoint()
     # event-streams
-    get_event_streams = get_event_streams
+    get_event_streams = LazyEndpoint()
     # hosts
-    hosts_query_devices = hosts_query_devices
-    host_action = host_action
-    hosts_hidden = hosts_hidden
-    hosts_detail = hosts_detail
+    hosts_query_devices = LazyEndpoint()
+    host_action = LazyEndpoint()
+    host_action_bulk = LazyEndpoint()
+    hosts_hidden = LazyEndpoint()
+    hosts_detail = LazyEndpoint()
+    hosts_query_devices_scroll = LazyEndpoint()
+    scroll_host_ids = LazyEndpoint()
+    iter_hosts = LazyEndpoint()
 
     # incidents
-    incidents_behaviors_by_id = incidents_behaviors_by_id
-    incidents_get_crowdscores = incidents_get_crowdscores
-    incidents_get_details = incidents_get_details
-    incidents_perform_actions = incidents_perform_actions
-    incidents_query = incidents_query
-    incidents_query_behaviors = incidents_query_behaviors
+    incidents_behaviors_by_id = LazyEndpoint()
+    incidents_get_crowdscores = LazyEndpoint()
+    incidents_get_details = LazyEndpoint()
+    incidents_perform_actions = LazyEndpoint()
+    incidents_query = LazyEndpoint()
+    incidents_query_behaviors = LazyEndpoint()
 
     #hostgroups
-    create_host_group = create_host_group
-    search_host_groups = search_host_groups
-    get_host_groups = get_host_groups
-    update_host_group = update_host_group
-    delete_host_groups = delete_host_groups
+    create_host_group = LazyEndpoint()
+    search_host_groups = LazyEndpoint()
+    get_host_groups = LazyEndpoint()
+    update_host_group = LazyEndpoint()
+    delete_host_groups = LazyEndpoint()
 
     # intel
-    get_intel_indicators = get_intel_indicators
+    get_intel_indicators = LazyEndpoint()
 
     #rtr
-    create_rtr_session = create_rtr_session
-    delete_rtr_session = delete_rtr_session
-    list_rtr_session_ids = list_rtr_session_ids
+    create_rtr_session = LazyEndpoint()
+    delete_rtr_session = LazyEndpoint()
+    list_rtr_session_ids = LazyEndpoint()
 
-    rtr_command_status = rtr_command_status
-    rtr_execute_command = rtr_execute_command
-    rtr_command_status_wait = rtr_command_status_wait
+    rtr_command_status = LazyEndpoint()
+    rtr_execute_command = LazyEndpoint()
+    rtr_command_status_wait = LazyEndpoint()
 
     #rtr_admin
-    search_rtr_scripts = search_rtr_scripts
-    get_rtr_scripts = get_rtr_scripts
+    search_rtr_scripts = LazyEndpoint()
+    get_rtr_scripts = LazyEndpoint()
+
+    # pagination
+    paginate = LazyEndpoint()
+
+def __getattr__(name: str):
+    """ lazily exposes the endpoint functions and AsyncCrowdstrikeAPI at the package level """
+    if name == 'AsyncCrowdstrikeAPI':
+        from .async_api import AsyncCrowdstrikeAPI # pylint: disable=import-outside-toplevel
+        return AsyncCrowdstrikeAPI
+    if name in ENDPOINT_MODULES:
+        return lazy_import_endpoint(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
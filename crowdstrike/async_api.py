@@ -0,0 +1,149 @@
+""" asyncio interface to the Crowdstrike API
+
+Every endpoint on CrowdstrikeAPI is mirrored as a coroutine on AsyncCrowdstrikeAPI, eg:
+
+    async with AsyncCrowdstrikeAPI(CLIENT_ID, CLIENT_SECRET, max_concurrency=20) as crowdstrike:
+        results = await asyncio.gather(*[crowdstrike.hosts_detail(ids=[aid]) for aid in aids])
+
+The calls are run on a worker pool sized to max_concurrency, sharing the one pooled
+session (and token, and rate limiter) of the underlying CrowdstrikeAPI client, so
+the argument validation and request handling are exactly the same as the blocking version.
+"""
+
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from . import API_BASEURL, CrowdstrikeAPI
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+# things on CrowdstrikeAPI that aren't endpoints
+NOT_ENDPOINTS = ('do_request', 'token_needs_refresh', 'configure_connection_pool')
+
+class AsyncCrowdstrikeAPI:
+    """ asyncio Crowdstrike API """
+    def __init__(self,
+                 client_id: str = None,
+                 client_secret: str = None,
+                 api_baseurl: str = API_BASEURL,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 api: CrowdstrikeAPI = None,
+                 ):
+        """ Takes the same arguments as CrowdstrikeAPI, or an existing CrowdstrikeAPI object as api
+
+        - max_concurrency (int) - the maximum number of requests in flight at once
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency needs to be at least 1")
+        # a client that was passed in belongs to the caller, so close() leaves its sessions alone
+        self.owns_api = api is None
+        if api is None:
+            if not client_id or not client_secret:
+                raise ValueError("Need to specify client_id and client_secret, or an existing CrowdstrikeAPI object as api")
+            api = CrowdstrikeAPI(client_id, client_secret, api_baseurl=api_baseurl, pool_maxsize=max_concurrency)
+        elif api.pool_maxsize < max_concurrency:
+            # make sure the connection pool can hold a connection for every worker
+            api.configure_connection_pool(pool_connections=api.pool_connections,
+                                          pool_maxsize=max_concurrency,
+                                          pool_block=api.pool_block,
+                                          keep_alive=api.keep_alive,
+                                          )
+        self.api = api
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='crowdstrike')
+        # created on first use, so it's bound to the running event loop
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        """ limits the number of calls in flight """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, function, *args, **kwargs):
+        """ runs a blocking function on the worker pool, respecting max_concurrency """
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    async def close(self):
+        """ shuts down the worker pool, and closes the pooled connections if this created the client """
+        # waiting for the workers to finish blocks, so it's done off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self.executor.shutdown, wait=True))
+        if self.owns_api:
+            self.api.oauth.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+def _make_async_iterator(function_name: str):
+    """ builds the async generator version of a generator function on CrowdstrikeAPI, ie paginate()
+
+    each step of the generator runs on the worker pool, so fetching pages doesn't block the event loop
+    """
+    sync_function = getattr(CrowdstrikeAPI, function_name)
+
+    async def endpoint(self, *args, **kwargs):
+        logger.debug(f"async {function_name}()")
+        generator = getattr(self.api, function_name)(*args, **kwargs)
+        finished = object()
+        future = None
+
+        def close_generator(_=None):
+            """ closes the generator on the worker pool, closing can block (ie joining a producer thread) """
+            try:
+                self.executor.submit(generator.close)
+            except RuntimeError:
+                # the worker pool's been shut down
+                generator.close()
+
+        try:
+            while True:
+                async with self.semaphore:
+                    future = self.executor.submit(next, generator, finished)
+                    item = await asyncio.wrap_future(future)
+                if item is finished:
+                    return
+                yield item
+        finally:
+            if future is None:
+                generator.close()
+            else:
+                # if this was cancelled mid-page next() is still running on a worker, and closing the
+                # generator then raises "generator already executing", so it's closed once that's returned
+                future.add_done_callback(close_generator)
+
+    endpoint.__name__ = function_name
+    endpoint.__qualname__ = f"AsyncCrowdstrikeAPI.{function_name}"
+    endpoint.__doc__ = sync_function.__doc__
+    return endpoint
+
+def _make_async_endpoint(function_name: str):
+    """ builds the coroutine version of CrowdstrikeAPI.function_name """
+    sync_function = getattr(CrowdstrikeAPI, function_name)
+
+    async def endpoint(self, *args, **kwargs):
+        logger.debug(f"async {function_name}()")
+        return await self.run(getattr(self.api, function_name), *args, **kwargs)
+
+    endpoint.__name__ = function_name
+    endpoint.__qualname__ = f"AsyncCrowdstrikeAPI.{function_name}"
+    endpoint.__doc__ = sync_function.__doc__
+    return endpoint
+
+for _function_name, _function in inspect.getmembers(CrowdstrikeAPI, inspect.isfunction):
+    if _function_name.startswith('_') or _function_name in NOT_ENDPOINTS:
+        continue
+    if inspect.isgeneratorfunction(_function):
+        setattr(AsyncCrowdstrikeAPI, _function_name, _make_async_iterator(_function_name))
+    else:
+        setattr(AsyncCrowdstrikeAPI, _function_name, _make_async_endpoint(_function_name))
@@ -0,0 +1,128 @@
+""" backfills detection IDs over a long time range by splitting it into shards that are fetched in parallel
+
+    for detection_id in crowdstrike.backfill_detects(start='2021-01-01T00:00:00Z', end='2021-04-01T00:00:00Z'):
+        ...
+
+Deep offsets on get_detects are slow (and capped), so rather than paging through one huge result set
+the range is split on first_behavior. Each shard's fetched in one request; a shard with more results
+than fit in a page is split in half and both halves are queued again. Shards that are likely to be
+too big (the first ones, and halves of a shard that was much too big) are checked with a limit=1
+request first, so a full page isn't fetched just to be thrown away. IDs are yielded as shards
+finish, so they're not in any particular order, and each one's only yielded once.
+"""
+
+import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from loguru import logger
+
+from .pagination import PAGINATION_LIMITS, check_page_errors, page_resources, page_total
+from .utilities import parse_timestamp, validate_kwargs
+
+BACKFILL_SHARDS = 16
+BACKFILL_WORKERS = 4
+BACKFILL_MAX_SHARD_SIZE = PAGINATION_LIMITS['get_detects']
+# shards aren't split any smaller than this, a shard this short that's still too big is paged through instead
+BACKFILL_MIN_SHARD_SECONDS = 1
+
+def format_timestamp(value: datetime.datetime) -> str:
+    """ formats a datetime for FQL """
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def split_range(start: datetime.datetime, end: datetime.datetime, count: int) -> list:
+    """ splits start-end into up to count (start, end) shards, on whole seconds """
+    seconds = int((end - start).total_seconds())
+    count = max(1, min(count, seconds))
+    bounds = [start + datetime.timedelta(seconds=seconds * index // count) for index in range(count)] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def backfill_detects(self, start, end=None, **kwargs):
+    """ yields every detection ID with a first_behavior from start up to (not including) end
+
+    - start (datetime or str) - ie 2021-01-01T00:00:00Z
+    - end (datetime or str) - defaults to now
+    - filter (str) - an extra FQL filter, ie "max_severity:>=50"
+    - shards (int) - how many shards to start with, defaults to 16
+    - workers (int) - how many shards to fetch at once, defaults to 4
+    - max_shard_size (int) - the page size, shards with more results than this are split, defaults to 9999
+
+    hydrate the IDs with get_detections(), it batches large lists
+    """
+    args_validation = {
+        'filter' : str,
+        'shards' : int,
+        'workers' : int,
+        'max_shard_size' : int,
+    }
+    validate_kwargs(args_validation, kwargs)
+    extra_filter = kwargs.get('filter')
+    shards = kwargs.get('shards', BACKFILL_SHARDS)
+    workers = kwargs.get('workers', BACKFILL_WORKERS)
+    max_shard_size = kwargs.get('max_shard_size', BACKFILL_MAX_SHARD_SIZE)
+    if not 1 <= max_shard_size <= BACKFILL_MAX_SHARD_SIZE:
+        raise ValueError(f"max_shard_size needs to be from 1-{BACKFILL_MAX_SHARD_SIZE}")
+    if shards < 1 or workers < 1:
+        raise ValueError("shards and workers need to be at least 1")
+    start = parse_timestamp(start)
+    end = parse_timestamp(end) if end is not None else datetime.datetime.now(datetime.timezone.utc)
+    if end <= start:
+        raise ValueError("end needs to be after start")
+
+    def shard_filter(shard_start, shard_end) -> str:
+        filters = [f"first_behavior:>='{format_timestamp(shard_start)}'", f"first_behavior:<'{format_timestamp(shard_end)}'"]
+        if extra_filter:
+            filters.append(extra_filter)
+        return '+'.join(filters)
+
+    def fetch(shard_start, shard_end, estimate: int = None) -> tuple:
+        """ returns (the shard's IDs, None), or (None, its total) if it needs splitting
+
+        estimate is roughly how many results the shard has, if it's not known or it's too many for a page
+        the total's checked with a limit=1 request before fetching the page
+        """
+        query_filter = shard_filter(shard_start, shard_end)
+        splittable = (shard_end - shard_start).total_seconds() >= 2 * BACKFILL_MIN_SHARD_SECONDS
+        if splittable and (estimate is None or estimate > max_shard_size // 2):
+            probe = self.get_detects(filter=query_filter, limit=1)
+            check_page_errors(probe, f"Backfilling {query_filter}")
+            total = page_total(probe)
+            if total is not None and total > max_shard_size:
+                return None, total
+            if total is not None and total <= len(page_resources(probe)):
+                return page_resources(probe), None
+        page = self.get_detects(filter=query_filter, limit=max_shard_size)
+        check_page_errors(page, f"Backfilling {query_filter}")
+        ids = page_resources(page)
+        total = page_total(page)
+        if total is None or total <= len(ids):
+            return ids, None
+        if splittable:
+            return None, total
+        logger.debug(f"{query_filter} has {total} results and can't be split, paging through it")
+        return list(self.paginate('get_detects', filter=query_filter, limit=max_shard_size)), None
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crowdstrike-backfill')
+    pending = {}
+    seen = set()
+    try:
+        for shard in split_range(start, end, shards):
+            pending[executor.submit(fetch, *shard)] = shard
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                shard_start, shard_end = pending.pop(future)
+                ids, total = future.result()
+                if ids is None:
+                    logger.debug(f"Splitting shard {format_timestamp(shard_start)} - {format_timestamp(shard_end)}, it has {total} results")
+                    for shard in split_range(shard_start, shard_end, 2):
+                        pending[executor.submit(fetch, *shard, total // 2)] = shard
+                    continue
+                for detection_id in ids:
+                    if detection_id not in seen:
+                        seen.add(detection_id)
+                        yield detection_id
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+    logger.debug(f"Backfilled {len(seen)} detection IDs")
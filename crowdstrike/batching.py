@@ -0,0 +1,54 @@
+""" splits large ID lists for the entity endpoints into batches, and merges the responses back together """
+
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+# endpoint : the most IDs it takes in one request
+ENTITY_BATCH_LIMITS = {
+    # GET requests put the IDs in the query string, so they're kept short
+    'hosts_detail' : 100,
+    'get_host_groups' : 100,
+    # POST requests send the IDs in the body
+    'get_detections' : 1000,
+    'incidents_get_details' : 500,
+    'host_action' : 100,
+    'update_detection' : 1000,
+}
+
+# how many batches are requested at once
+BATCH_WORKERS = 4
+
+def merge_entity_responses(responses: list) -> dict:
+    """ merges the json responses from a set of batched calls into one
+
+    resources and errors are concatenated, meta comes from the first response
+    with query_time summed and the trace_ids of every batch in trace_ids
+    """
+    merged = {
+        'meta' : dict(responses[0].get('meta') or {}),
+        'resources' : [],
+        'errors' : [],
+    }
+    query_time = 0
+    trace_ids = []
+    for response in responses:
+        merged['resources'].extend(response.get('resources') or [])
+        merged['errors'].extend(response.get('errors') or [])
+        meta = response.get('meta') or {}
+        query_time += meta.get('query_time') or 0
+        if meta.get('trace_id'):
+            trace_ids.append(meta.get('trace_id'))
+    merged['meta']['query_time'] = query_time
+    merged['meta']['trace_ids'] = trace_ids
+    return merged
+
+def batched_entity_request(fetch, ids: list, batch_size: int, workers: int = BATCH_WORKERS) -> dict:
+    """ calls fetch(batch) for each batch_size chunk of ids, concurrently, and merges the responses """
+    batches = [ids[index:index + batch_size] for index in range(0, len(ids), batch_size)]
+    if len(batches) <= 1:
+        return fetch(ids)
+    logger.debug(f"Splitting {len(ids)} IDs into {len(batches)} batches of up to {batch_size}")
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches)), thread_name_prefix='crowdstrike-batch') as executor:
+        responses = list(executor.map(fetch, batches))
+    return merge_entity_responses(responses)
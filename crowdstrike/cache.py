@@ -0,0 +1,239 @@
+""" opt-in response cache for the read-mostly entity endpoints
+
+    crowdstrike = CrowdstrikeAPI(CLIENT_ID, CLIENT_SECRET, response_cache=ResponseCache())
+
+Only GET requests to the endpoints in DEFAULT_CACHE_TTLS (or the ttls you pass in) are cached.
+Entries are evicted least-recently-used once there's more than maxsize of them. Once an entry's
+TTL runs out it's served stale for up to stale_while_revalidate seconds while a background
+request refreshes it. Mutating calls (host_action, update_host_group etc) drop the cached
+entries for the entities they touched.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from loguru import logger
+
+# uri : seconds to cache the response for
+DEFAULT_CACHE_TTLS = {
+    '/sensors/queries/installers/ccid/v1' : 3600, # get_ccid
+    '/sensors/entities/installers/v1' : 3600, # get_sensor_installer_details
+    '/devices/entities/host-groups/v1' : 300, # get_host_groups
+    '/real-time-response/entities/scripts/v1' : 300, # get_rtr_scripts
+    '/devices/entities/devices/v1' : 60, # hosts_detail
+}
+
+# (method, uri) of a mutating call : the cached uris it invalidates
+DEFAULT_CACHE_INVALIDATIONS = {
+    ('post', '/devices/entities/devices-actions/v2') : ['/devices/entities/devices/v1'], # host_action
+    ('patch', '/devices/entities/host-groups/v1') : ['/devices/entities/host-groups/v1'], # update_host_group
+    ('delete', '/devices/entities/host-groups/v1') : ['/devices/entities/host-groups/v1'], # delete_host_groups
+}
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_STALE_WHILE_REVALIDATE = 30
+
+def extract_ids(data) -> set:
+    """ pulls the entity IDs out of request data, handles ids=[], ids='x', id='x' and resources=[{'id':...}] """
+    found = set()
+    if not isinstance(data, dict):
+        return found
+    for key in ('ids', 'id'):
+        value = data.get(key)
+        if isinstance(value, str):
+            found.add(value)
+        elif isinstance(value, list):
+            found.update(item for item in value if isinstance(item, str))
+    for resource in data.get('resources') or []:
+        if isinstance(resource, dict) and isinstance(resource.get('id'), str):
+            found.add(resource.get('id'))
+    return found
+
+class LRUCache:
+    """ thread-safe, size-bounded least-recently-used cache with per-entry expiry
+
+    get() returns (value, expired) or None, expired values are kept until stale_until passes
+    """
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        if maxsize < 1:
+            raise ValueError("maxsize needs to be at least 1")
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        """ returns (value, expired) or None if it's not there or past stale_until """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, stale_until = entry
+            if now >= stale_until:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value, now >= expires_at
+
+    def set(self, key, value, ttl: float, stale_ttl: float = 0):
+        """ stores value for ttl seconds, it can be served stale for another stale_ttl seconds """
+        now = time.monotonic()
+        with self.lock:
+            self.entries[key] = (value, now + ttl, now + ttl + stale_ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        """ removes a key if it's there """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_matching(self, match) -> int:
+        """ removes every entry where match(key) is True, returns how many were removed """
+        with self.lock:
+            keys = [key for key in self.entries if match(key)]
+            for key in keys:
+                del self.entries[key]
+        return len(keys)
+
+    def clear(self):
+        """ empties the cache """
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+class ResponseCache:
+    """ caches responses from CrowdstrikeAPI.request(), see the module docstring """
+    def __init__(self,
+                 maxsize: int = DEFAULT_CACHE_SIZE,
+                 ttls: dict = None,
+                 invalidations: dict = None,
+                 stale_while_revalidate: float = DEFAULT_STALE_WHILE_REVALIDATE,
+                 ):
+        """
+        - maxsize (int) - the maximum number of responses to keep
+        - ttls (dict) - uri : seconds to cache for, defaults to DEFAULT_CACHE_TTLS
+        - invalidations (dict) - (method, uri) : [uris], defaults to DEFAULT_CACHE_INVALIDATIONS
+        - stale_while_revalidate (float) - seconds an expired response can be served while it's refreshed
+        """
+        self.ttls = dict(DEFAULT_CACHE_TTLS if ttls is None else ttls)
+        self.invalidations = dict(DEFAULT_CACHE_INVALIDATIONS if invalidations is None else invalidations)
+        self.stale_while_revalidate = stale_while_revalidate
+        self.entries = LRUCache(maxsize=maxsize)
+        self.lock = threading.Lock()
+        # keys currently being refreshed in the background
+        self.refreshing = set()
+        # bumped on every invalidation, so a background refresh that started before it doesn't put old data back
+        self.generation = 0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(request_method: str, uri: str, data) -> tuple:
+        """ builds the cache key for a request """
+        return ((request_method or 'get').lower(), uri, json.dumps(data, sort_keys=True))
+
+    def is_cacheable(self, request_method: str, uri: str) -> bool:
+        """ only GETs to the endpoints with a TTL get cached """
+        return (request_method or 'get').lower() == 'get' and uri in self.ttls
+
+    def get(self, request_method: str, uri: str, data, revalidate):
+        """ returns the cached response, or None
+
+        if the response is stale, revalidate() is called in a background thread to fetch a fresh one
+        """
+        if not self.is_cacheable(request_method, uri):
+            return None
+        key = self.make_key(request_method, uri, data)
+        cached = self.entries.get(key)
+        if cached is None:
+            with self.lock:
+                self.misses += 1
+            return None
+        response, expired = cached
+        with self.lock:
+            if not expired:
+                self.hits += 1
+                return response
+            self.stale_hits += 1
+            if key in self.refreshing:
+                return response
+            self.refreshing.add(key)
+            generation = self.generation
+        logger.debug(f"Serving stale response for {uri}, refreshing it in the background")
+        threading.Thread(target=self._revalidate, args=(key, request_method, uri, data, revalidate, generation), daemon=True).start()
+        return response
+
+    def _revalidate(self, key, request_method, uri, data, revalidate, generation):
+        """ fetches a fresh copy of a stale entry """
+        try:
+            self.store(request_method, uri, data, revalidate(), generation=generation)
+        except Exception as error: # pylint: disable=broad-except
+            logger.debug(f"Background refresh of {uri} failed: {error}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def store(self, request_method: str, uri: str, data, response, generation: int = None):
+        """ caches a successful response
+
+        generation is self.generation from before the request was sent, if there's been an invalidation
+        since then the response could be out of date, so it's not stored
+        """
+        if not self.is_cacheable(request_method, uri) or response.status_code != 200:
+            return
+        key = self.make_key(request_method, uri, data)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                logger.debug(f"Not caching {uri}, the cache was invalidated while it was being fetched")
+                return
+            self.entries.set(key, response, ttl=self.ttls[uri], stale_ttl=self.stale_while_revalidate)
+
+    def invalidate(self, request_method: str, uri: str, data) -> int:
+        """ drops the cached entries a mutating request could have changed, returns how many were dropped
+
+        if the request names specific IDs, only the entries that reference them are dropped,
+        otherwise everything cached for the affected endpoints goes
+        """
+        affected = self.invalidations.get(((request_method or 'get').lower(), uri))
+        if not affected:
+            return 0
+        ids = extract_ids(data)
+
+        def match(key):
+            cached_method, cached_uri, cached_data = key # pylint: disable=unused-variable
+            if cached_uri not in affected:
+                return False
+            if not ids:
+                return True
+            return bool(ids & extract_ids(json.loads(cached_data)))
+
+        with self.lock:
+            self.generation += 1
+        removed = self.entries.delete_matching(match)
+        logger.debug(f"{request_method} {uri} invalidated {removed} cached responses")
+        return removed
+
+    def clear(self):
+        """ drops everything """
+        with self.lock:
+            self.generation += 1
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        """ returns the cache statistics """
+        with self.lock:
+            return {
+                'size' : len(self.entries),
+                'hits' : self.hits,
+                'stale_hits' : self.stale_hits,
+                'misses' : self.misses,
+            }
@@ -0,0 +1,205 @@
+""" incremental detection sync, for forwarding detections (to a SIEM etc) without re-reading a wide window every poll
+
+    sync = DetectionSync('detections.json')
+    for detection in sync.poll(crowdstrike):
+        forward(detection)
+
+Each poll only asks for detections updated from the newest date_updated it's seen up to when the poll
+started, a window at a time (narrowed until each one fits in a single offset=0 page, so nothing's missed
+when detections are updated mid-poll), hydrates them with get_detections() in batches, and yields each
+version of a detection once.
+The checkpoint (the watermark and the IDs yielded at or after it) is saved after every batch, and when
+the consumer stops, so a restart carries on where it left off. The watermark only moves forward once a
+poll's been read to the end.
+"""
+
+import datetime
+import json
+
+from loguru import logger
+
+from .backfill import format_timestamp
+from .batching import ENTITY_BATCH_LIMITS
+from .pagination import PAGINATION_LIMITS, check_page_errors, page_resources, page_total
+from .utilities import atomic_write, parse_timestamp
+
+# the detections hydrated per get_detections() call
+DETECTION_SYNC_BATCH_SIZE = ENTITY_BATCH_LIMITS['get_detections']
+# the most IDs asked for per get_detects() call
+DETECTION_SYNC_PAGE_SIZE = PAGINATION_LIMITS['get_detects']
+# where the first poll starts if there's no checkpoint and no since
+DETECTION_SYNC_EPOCH = '2013-01-01T00:00:00Z'
+DETECTION_WATERMARK_FIELDS = ('date_updated', 'last_behavior')
+
+class DetectionSync:
+    """ checkpointed detection poller, see the module docstring """
+    def __init__(self, path: str = None, watermark_field: str = 'date_updated'):
+        """
+        - path (str) - the JSON file the checkpoint's kept in, if it's None the checkpoint's only kept in memory
+        - watermark_field (str) - date_updated (default, picks up changes to old detections) or last_behavior
+        """
+        if watermark_field not in DETECTION_WATERMARK_FIELDS:
+            raise ValueError(f"watermark_field should be one of {','.join(DETECTION_WATERMARK_FIELDS)}")
+        self.path = path
+        self.watermark_field = watermark_field
+        self.watermark = None
+        # detection_id : watermark value, for the detections yielded at or after the watermark
+        self.seen = {}
+        self.load()
+
+    def load(self):
+        """ reads the checkpoint from path, if it's there """
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'r') as file_handle:
+                checkpoint = json.load(file_handle)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            logger.warning(f"Ignoring unreadable detection checkpoint {self.path}: {error}")
+            return
+        if checkpoint.get('watermark_field') != self.watermark_field:
+            logger.warning(f"Ignoring detection checkpoint {self.path}, it's for {checkpoint.get('watermark_field')}")
+            return
+        self.watermark = checkpoint.get('watermark')
+        self.seen = checkpoint.get('seen') or {}
+
+    def save(self):
+        """ writes the checkpoint to path """
+        if self.path is None:
+            return
+        atomic_write(self.path, json.dumps({
+            'watermark_field' : self.watermark_field,
+            'watermark' : self.watermark,
+            'seen' : self.seen,
+        }))
+
+    def is_new(self, detection: dict) -> bool:
+        """ returns True if this version of the detection hasn't been yielded before """
+        value = detection.get(self.watermark_field)
+        if value is None:
+            return True
+        if self.watermark is not None and parse_timestamp(value) < parse_timestamp(self.watermark):
+            return False
+        return self.seen.get(detection.get('detection_id')) != value
+
+    def sort_key(self, detection: dict) -> datetime.datetime:
+        """ sorts detections oldest first, the ones without a watermark value go first """
+        value = detection.get(self.watermark_field)
+        return parse_timestamp(value) if value is not None else datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+    def mark_seen(self, detection: dict):
+        """ records that this version of the detection's been yielded, the watermark's only moved by advance() """
+        value = detection.get(self.watermark_field)
+        if value is not None:
+            self.seen[detection.get('detection_id')] = value
+
+    def advance(self):
+        """ moves the watermark up to the newest version that's been yielded, and forgets the IDs seen before it """
+        if not self.seen:
+            return
+        newest = max(self.seen.values(), key=parse_timestamp)
+        if self.watermark is None or parse_timestamp(newest) > parse_timestamp(self.watermark):
+            self.watermark = newest
+        watermark = parse_timestamp(self.watermark)
+        self.seen = {detection_id : value for detection_id, value in self.seen.items() if parse_timestamp(value) >= watermark}
+
+    def poll(self, api, filter_string: str = None, since: str = None, batch_size: int = DETECTION_SYNC_BATCH_SIZE,
+             fields: list = None, page_size: int = DETECTION_SYNC_PAGE_SIZE):
+        """ yields the detections that are new or updated since the last poll, oldest window first
+
+        - api (CrowdstrikeAPI) - the client to use
+        - filter_string (str) - an extra FQL filter, ie "max_severity:>=50"
+        - since (str) - where to start if there's no checkpoint yet, ie 2021-01-01T00:00:00Z, otherwise it's everything
+        - batch_size (int) - detections per get_detections() call
+        - fields (list) - only keep these (dotted) fields, detection_id and the watermark field are always kept
+        - page_size (int) - the most IDs asked for per get_detects() call, windows with more than this are narrowed
+        """
+        if not 1 <= batch_size <= DETECTION_SYNC_BATCH_SIZE:
+            raise ValueError(f"batch_size needs to be from 1-{DETECTION_SYNC_BATCH_SIZE}")
+        if not 1 <= page_size <= DETECTION_SYNC_PAGE_SIZE:
+            raise ValueError(f"page_size needs to be from 1-{DETECTION_SYNC_PAGE_SIZE}")
+        detection_kwargs = {'fields' : list(fields) + ['detection_id', self.watermark_field]} if fields else {}
+        field = self.watermark_field
+        # get_detections() returns the current version of each detection, which can be newer than what the
+        # query matched, so the poll's capped at when it started and anything newer's left for the next one
+        upper_time = parse_timestamp(format_timestamp(datetime.datetime.now(datetime.timezone.utc)))
+        filters = [filter_string] if filter_string else []
+
+        def window_ids(window_start: str, window_end: str, splittable: bool, probe: bool):
+            """ returns the IDs updated from window_start to window_end, or None if there's too many for a page
+
+            probe checks the total with a limit=1 request first, for windows that are likely to be too big
+            """
+            # >= so detections sharing the start's timestamp aren't missed, the seen IDs stop them repeating
+            query_filter = '+'.join(filters + [f"{field}:>='{window_start}'", f"{field}:<='{window_end}'"])
+            logger.debug(f"Polling detections, filter={query_filter}")
+            if splittable and probe:
+                page = api.get_detects(filter=query_filter, limit=1)
+                check_page_errors(page, f"Polling {query_filter}")
+                total = page_total(page)
+                if total is not None and total > page_size:
+                    return None
+                if total is not None and total <= len(page_resources(page)):
+                    return page_resources(page)
+            page = api.get_detects(filter=query_filter, limit=page_size)
+            check_page_errors(page, f"Polling {query_filter}")
+            ids = page_resources(page)
+            total = page_total(page)
+            if total is None or total <= len(ids):
+                return ids
+            if splittable:
+                return None
+            logger.debug(f"{query_filter} has {total} results and can't be narrowed, paging through it")
+            return list(api.paginate('get_detects', filter=query_filter, limit=page_size))
+
+        def hydrate(ids: list):
+            """ yields the new detections from a batch of IDs """
+            response = api.get_detections(ids=ids, **detection_kwargs)
+            check_page_errors(response, "get_detections()")
+            for detection in sorted(page_resources(response), key=self.sort_key):
+                value = detection.get(field)
+                if value is not None and parse_timestamp(value) > upper_time:
+                    logger.debug(f"{detection.get('detection_id')} was updated after the poll started, leaving it for the next one")
+                    continue
+                if self.is_new(detection):
+                    yield detection
+                    # only marked once the consumer's asked for the next one
+                    self.mark_seen(detection)
+
+        # paged by keyset rather than offset: each window's read in one offset=0 request, then the next one
+        # starts where it ended. date_updated isn't a documented get_detects sort, so this doesn't rely on the
+        # order results come back in, and a detection that's updated part way through can't shift the others
+        # out of a page - it just turns up again in a later window (or the next poll) with its new timestamp
+        window_start = self.watermark or since or DETECTION_SYNC_EPOCH
+        start_time = parse_timestamp(window_start)
+        width = upper_time - start_time
+        probe = False
+        finished = False
+        try:
+            while True:
+                end_time = min(upper_time, parse_timestamp(format_timestamp(start_time + width)))
+                splittable = (end_time - start_time).total_seconds() >= 2
+                ids = window_ids(window_start, format_timestamp(end_time), splittable, probe)
+                if ids is None:
+                    width = datetime.timedelta(seconds=int((end_time - start_time).total_seconds()) // 2)
+                    probe = True
+                    continue
+                for index in range(0, len(ids), batch_size):
+                    yield from hydrate(ids[index:index + batch_size])
+                    self.save()
+                if end_time >= upper_time:
+                    break
+                window_start, start_time = format_timestamp(end_time), end_time
+                # try a wider window next time, it's narrowed again if that's too busy
+                width = width * 2
+                probe = False
+            finished = True
+        finally:
+            # the watermark only moves once the whole poll's been read, until then the seen IDs stop repeats,
+            # so if the consumer stops part way through only the detection it stopped on is sent again
+            if finished:
+                self.advance()
+            self.save()
+            logger.debug(f"Detection poll finished, watermark is now {self.watermark}")
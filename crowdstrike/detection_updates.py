@@ -0,0 +1,164 @@
+""" write-behind queue for detection updates, so lots of single updates go out as a few batched PATCHes
+
+    with DetectionUpdateBatcher(crowdstrike) as batcher:
+        futures = [batcher.update(detection_id, status='false_positive', show_in_ui=False) for detection_id in ids]
+    results = [future.result() for future in futures]
+
+Updates with the same payload (status, assigned_to_uuid, show_in_ui, comment) are grouped into one
+update_detection() call with many ids. A group's sent once it reaches batch_size, or flush_interval
+seconds after its first update, whichever's first. Each update() returns a Future that's resolved
+with the response (or the error) for that detection.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+from loguru import logger
+
+from .batching import ENTITY_BATCH_LIMITS
+from .detects import VALID_DETECT_STATUS
+
+DETECTION_UPDATE_BATCH_SIZE = ENTITY_BATCH_LIMITS['update_detection']
+DETECTION_UPDATE_FLUSH_INTERVAL = 5.0
+DETECTION_UPDATE_FIELDS = ('status', 'assigned_to_uuid', 'show_in_ui', 'comment')
+
+class DetectionUpdateBatcher:
+    """ coalesces update_detection() calls, see the module docstring """
+    def __init__(self, api, batch_size: int = DETECTION_UPDATE_BATCH_SIZE, flush_interval: float = DETECTION_UPDATE_FLUSH_INTERVAL):
+        """
+        - api (CrowdstrikeAPI) - the client to use
+        - batch_size (int) - the most ids per update_detection() call
+        - flush_interval (float) - the longest an update waits before it's sent
+        """
+        if not 1 <= batch_size <= DETECTION_UPDATE_BATCH_SIZE:
+            raise ValueError(f"batch_size needs to be from 1-{DETECTION_UPDATE_BATCH_SIZE}")
+        self.api = api
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.condition = threading.Condition()
+        # payload key : {'payload' : dict, 'futures' : {id : Future}, 'started' : monotonic time}
+        self.pending = {}
+        # serialises sending, so updates to the same detection go out in the order they were made
+        self.send_lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name='crowdstrike-detection-updates', daemon=True)
+        self.thread.start()
+
+    def update(self, detection_id: str, **kwargs) -> Future:
+        """ queues an update for one detection, takes the same arguments as update_detection() (other than ids)
+
+        returns a Future for the update_detection() response, if the same update's already queued
+        for this detection it gets the same Future
+        """
+        for key in kwargs:
+            if key not in DETECTION_UPDATE_FIELDS:
+                raise ValueError(f"{key} not a valid argument")
+        if not kwargs:
+            raise ValueError(f"Nothing to update, set one or more of {','.join(DETECTION_UPDATE_FIELDS)}")
+        if 'status' in kwargs and kwargs.get('status') not in VALID_DETECT_STATUS:
+            raise ValueError(f"Status '{kwargs.get('status')}' invalid - should be in {VALID_DETECT_STATUS}")
+        key = tuple(sorted(kwargs.items()))
+
+        flush_first = False
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("This batcher's been closed")
+            group = self.pending.get(key)
+            if group is not None and detection_id in group['futures']:
+                return group['futures'][detection_id]
+            # a different update to the same detection is waiting, it has to go first
+            flush_first = any(detection_id in other['futures'] for other in self.pending.values())
+        if flush_first:
+            self.flush()
+
+        future = Future()
+        with self.condition:
+            group = self.pending.get(key)
+            if group is None:
+                group = self.pending[key] = {'payload' : dict(kwargs), 'futures' : {}, 'started' : time.monotonic()}
+                # the background thread works out when to wake up from the oldest group, so it needs to know
+                self.condition.notify()
+            group['futures'][detection_id] = future
+            if len(group['futures']) >= self.batch_size:
+                self.condition.notify()
+        return future
+
+    def _take(self, force: bool = False) -> list:
+        """ removes and returns the groups that are due to be sent, call it with the condition held """
+        now = time.monotonic()
+        due = [key for key, group in self.pending.items()
+               if force or len(group['futures']) >= self.batch_size or now - group['started'] >= self.flush_interval]
+        return [self.pending.pop(key) for key in due]
+
+    def _send(self, groups: list):
+        """ sends the groups in batch_size chunks and resolves their futures """
+        for group in groups:
+            items = list(group['futures'].items())
+            for index in range(0, len(items), self.batch_size):
+                chunk = dict(items[index:index + self.batch_size])
+                try:
+                    response = self.api.update_detection(ids=list(chunk), **group['payload'])
+                except Exception as error: # pylint: disable=broad-except
+                    logger.error(f"Updating {len(chunk)} detections failed: {error}")
+                    for future in chunk.values():
+                        future.set_exception(error)
+                    continue
+                errors = [error for error in response.get('errors') or [] if isinstance(error, dict)]
+                for detection_id, future in chunk.items():
+                    # errors that name a detection only fail that detection
+                    matching = [error for error in errors if error.get('id') == detection_id or detection_id in str(error.get('message'))]
+                    if matching:
+                        future.set_exception(RuntimeError('; '.join(str(error.get('message')) for error in matching)))
+                    else:
+                        future.set_result(response)
+                logger.debug(f"Updated {len(chunk)} detections with {group['payload']}")
+
+    def _wait_time(self) -> float:
+        """ how long until the next group's due, None if nothing's queued, call it with the condition held """
+        if not self.pending:
+            return None
+        if any(len(group['futures']) >= self.batch_size for group in self.pending.values()):
+            return 0
+        oldest = min(group['started'] for group in self.pending.values())
+        return max(0.0, oldest + self.flush_interval - time.monotonic())
+
+    def _run(self):
+        """ the background thread, sends groups as they fill up or time out """
+        while True:
+            # groups are taken with the send lock held, so nothing can be sent between taking and sending them
+            with self.send_lock:
+                with self.condition:
+                    if self.closed:
+                        return
+                    groups = self._take()
+                self._send(groups)
+            with self.condition:
+                if self.closed:
+                    return
+                timeout = self._wait_time()
+                if timeout is None or timeout > 0:
+                    self.condition.wait(timeout=timeout)
+
+    def flush(self):
+        """ sends everything that's queued, and waits for it to go """
+        with self.send_lock:
+            with self.condition:
+                groups = self._take(force=True)
+            self._send(groups)
+
+    def close(self):
+        """ sends everything that's queued and stops the background thread """
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        # anything that was queued while closing
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,8 +2,36 @@
 
 from loguru import logger
 
+from .batching import batched_entity_request, ENTITY_BATCH_LIMITS
+from .projection import project_page
+from .utilities import validate_kwargs
+
 VALID_DETECT_STATUS = ['new', 'in_progress', 'true_positive', 'false_positive', 'ignored']
 
+# the aggregate query types get_detects_aggregates() accepts
+AGGREGATE_TYPES = ['terms', 'date_histogram', 'date_range', 'range', 'cardinality', 'max', 'min', 'avg', 'sum', 'percentiles']
+AGGREGATE_INTERVALS = ['year', 'month', 'week', 'day', 'hour', 'minute']
+# the keys an aggregate query can have, and their types
+AGGREGATE_FIELDS = {
+    'name' : str,
+    'type' : str,
+    'field' : str,
+    'filter' : str,
+    'q' : str,
+    'size' : int,
+    'sort' : str,
+    'min_doc_count' : int,
+    'missing' : str,
+    'interval' : str,
+    'time_zone' : str,
+    'ranges' : list,
+    'date_ranges' : list,
+    'include' : str,
+    'exclude' : str,
+    'from' : int,
+    'sub_aggregates' : list,
+}
+
 def get_detects(self, **kwargs):
     """ Search for detection IDs that match a given query
 
@@ -39,11 +67,18 @@ def get_detects(self, **kwargs):
 
     return response.json()
 
-def get_detections(self, ids: list):
-    """ view detection information """
+def get_detections(self, ids: list, fields: list = None):
+    """ view detection information
+
+    fields (list) - only keep these fields of each detection, dotted paths work, ie ['detection_id', 'device.hostname', 'behaviors.tactic']
+
+    large lists of ids are requested in concurrent batches and the responses merged
+    """
 
     if not isinstance(ids, list):
         raise TypeError(f"ids should be of type 'list', got '{type(ids)}'")
+    if len(ids) > ENTITY_BATCH_LIMITS['get_detections']:
+        return batched_entity_request(lambda batch: self.get_detections(ids=batch, fields=fields), ids, ENTITY_BATCH_LIMITS['get_detections'])
 
     uri = '/detects/entities/summaries/GET/v1'
     response = self.request(uri=uri,
@@ -53,6 +88,68 @@ def get_detections(self, ids: list):
     logger.debug(response)
     response.raise_for_status()
 
+    return project_page(response.json(), fields)
+
+def aggregate_query(aggregate_type: str, field: str, name: str = None, **kwargs) -> dict:
+    """ builds one aggregate query for get_detects_aggregates()
+
+    - aggregate_type (str) - one of AGGREGATE_TYPES
+    - field (str) - the detection field to aggregate on, ie max_severity_displayname
+    - name (str) - what to call the result, defaults to the field name
+
+    anything else in AGGREGATE_FIELDS can be set too, ie filter, size, sub_aggregates
+    """
+    if aggregate_type not in AGGREGATE_TYPES:
+        raise ValueError(f"Invalid aggregate type {aggregate_type}, should be one of {','.join(AGGREGATE_TYPES)}")
+    query = dict(kwargs, type=aggregate_type, field=field, name=name or field)
+    validate_kwargs(AGGREGATE_FIELDS, query)
+    return query
+
+def terms_aggregate(field: str, size: int = 10, **kwargs) -> dict:
+    """ counts the detections for each of the top size values of field, ie by host or by tactic """
+    return aggregate_query('terms', field, size=size, **kwargs)
+
+def date_histogram_aggregate(field: str = 'first_behavior', interval: str = 'day', **kwargs) -> dict:
+    """ counts the detections in each interval (one of AGGREGATE_INTERVALS) """
+    if interval not in AGGREGATE_INTERVALS:
+        raise ValueError(f"Invalid interval {interval}, should be one of {','.join(AGGREGATE_INTERVALS)}")
+    return aggregate_query('date_histogram', field, interval=interval, **kwargs)
+
+def facet_aggregates(fields: list, size: int = 10, **kwargs) -> list:
+    """ a terms aggregate for each field, to get the counts for several facets in one request """
+    return [terms_aggregate(field, size=size, **kwargs) for field in fields]
+
+def aggregate_buckets(response: dict, name: str) -> dict:
+    """ returns { label : count } for the named aggregate in a get_detects_aggregates() response """
+    for resource in response.get('resources') or []:
+        if resource.get('name') == name:
+            return {bucket.get('label') : bucket.get('count') for bucket in resource.get('buckets') or []}
+    raise ValueError(f"No aggregate called {name} in the response")
+
+def get_detects_aggregates(self, aggregates: list):
+    """ counts detections server-side, so only the buckets come back rather than every detection
+
+    aggregates (list) - the queries, build them with terms_aggregate(), date_histogram_aggregate(),
+        facet_aggregates() or aggregate_query(). For example, detections by severity per day:
+
+        date_histogram_aggregate(interval='day', sub_aggregates=[terms_aggregate('max_severity_displayname')])
+
+    use aggregate_buckets() to pull { label : count } out of the response
+    """
+    if not isinstance(aggregates, list) or not aggregates:
+        raise TypeError("aggregates should be a list of aggregate queries")
+    for aggregate in aggregates:
+        validate_kwargs(AGGREGATE_FIELDS, aggregate, required=['type', 'field', 'name'])
+
+    uri = '/detects/aggregates/detects/GET/v1'
+    method = 'post'
+    response = self.request(uri=uri,
+                            request_method=method,
+                            data=aggregates,
+                            )
+    logger.debug(response)
+    response.raise_for_status()
+
     return response.json()
 
 def update_detection(self, **kwargs):
@@ -72,14 +169,29 @@ def update_detection(self, **kwargs):
      - ignored
 
     comment (str) optional comment to add to the detection
+
+    more than ENTITY_BATCH_LIMITS['update_detection'] ids are sent in concurrent batches and the responses merged,
+    see DetectionUpdateBatcher (in detection_updates) for queueing lots of single updates
     """
     uri = '/detects/entities/detects/v2'
-
+    method = 'patch'
+
+    args_validation = {
+        'ids' : list,
+        'status' : str,
+        'assigned_to_uuid' : str,
+        'show_in_ui' : bool,
+        'comment' : str,
+    }
+    validate_kwargs(args_validation, kwargs, required=['ids'])
     if 'status' in kwargs and kwargs.get('status') not in VALID_DETECT_STATUS:
         set_status = kwargs.get('status')
         raise ValueError(f"Status '{set_status}' invalid - should be in {VALID_DETECT_STATUS}")
+    if len(kwargs.get('ids')) > ENTITY_BATCH_LIMITS['update_detection']:
+        payload = {key : value for key, value in kwargs.items() if key != 'ids'}
+        return batched_entity_request(lambda batch: self.update_detection(ids=batch, **payload), kwargs.get('ids'), ENTITY_BATCH_LIMITS['update_detection'])
     response = self.request(uri=uri,
-                            request_method='patch',
+                            request_method=method,
                             data=kwargs,
                             )
     logger.debug(response)
@@ -0,0 +1,155 @@
+""" joins detections with the details of the host they happened on, without looking the same host up over and over
+
+    enricher = DetectionEnricher(crowdstrike)
+    for detection in enricher.enrich_ids(detection_ids):
+        forward(detection) # detection['host'] is the hosts_detail() record
+
+Detections are taken a window at a time, the device IDs they reference are de-duplicated, and only
+the ones that aren't in the host cache are looked up, in one batched hosts_detail() call. The cache
+can be shared between enrichers (and threads), so in steady state most detections need no host lookup.
+"""
+
+import threading
+
+from loguru import logger
+
+from .batching import ENTITY_BATCH_LIMITS
+from .cache import LRUCache
+from .pagination import check_page_errors, page_resources
+
+DEFAULT_HOST_CACHE_SIZE = 10000
+DEFAULT_HOST_CACHE_TTL = 300
+# hosts that weren't found are remembered for this long, so a removed host isn't looked up for every detection
+DEFAULT_HOST_CACHE_NEGATIVE_TTL = 60
+# how many detections are collected before their hosts are looked up
+ENRICHMENT_WINDOW = 500
+ENRICHED_HOST_KEY = 'host'
+
+def detection_device_id(detection: dict) -> str:
+    """ returns the device ID a detection happened on, or None """
+    return (detection.get('device') or {}).get('device_id')
+
+class HostCache:
+    """ a bounded, thread-safe cache of hosts_detail() records, misses are looked up in batches """
+    def __init__(self,
+                 api,
+                 maxsize: int = DEFAULT_HOST_CACHE_SIZE,
+                 ttl: float = DEFAULT_HOST_CACHE_TTL,
+                 negative_ttl: float = DEFAULT_HOST_CACHE_NEGATIVE_TTL,
+                 fields: list = None,
+                 ):
+        """
+        - api (CrowdstrikeAPI) - the client to use
+        - maxsize (int) - the most hosts to keep
+        - ttl (float) - seconds to keep a host for
+        - negative_ttl (float) - seconds to remember a host wasn't found
+        - fields (list) - only keep these (dotted) fields of each host, see hosts_detail()
+        """
+        self.api = api
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.fields = fields
+        self.entries = LRUCache(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookups = 0
+
+    def get_many(self, device_ids) -> dict:
+        """ returns { device_id : host record }, device IDs that don't exist (anymore) are left out """
+        found = {}
+        missing = []
+        hits = 0
+        for device_id in dict.fromkeys(device_ids):
+            cached = self.entries.get(device_id)
+            if cached is None:
+                missing.append(device_id)
+                continue
+            hits += 1
+            if cached[0] is not None:
+                found[device_id] = cached[0]
+        with self.lock:
+            self.hits += hits
+            self.misses += len(missing)
+            if missing:
+                self.lookups += 1
+        if missing:
+            detail_kwargs = {'fields' : list(self.fields) + ['device_id']} if self.fields else {}
+            response = self.api.hosts_detail(ids=missing, **detail_kwargs)
+            # hosts that have been removed come back as errors, they're cached as not found rather than raised
+            if response.get('errors'):
+                logger.debug(f"hosts_detail() errors: {response.get('errors')}")
+            for host in page_resources(response):
+                self.entries.set(host.get('device_id'), host, ttl=self.ttl)
+                found[host.get('device_id')] = host
+            for device_id in missing:
+                if device_id not in found:
+                    self.entries.set(device_id, None, ttl=self.negative_ttl)
+        return found
+
+    def get(self, device_id: str) -> dict:
+        """ returns one host record, or None """
+        return self.get_many([device_id]).get(device_id)
+
+    def stats(self) -> dict:
+        """ returns the cache statistics """
+        with self.lock:
+            return {
+                'size' : len(self.entries),
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'lookups' : self.lookups,
+            }
+
+class DetectionEnricher:
+    """ adds host details to detections, see the module docstring """
+    def __init__(self, api, host_cache: HostCache = None, window: int = ENRICHMENT_WINDOW):
+        """
+        - api (CrowdstrikeAPI) - the client to use
+        - host_cache (HostCache) - share one between enrichers, otherwise each gets its own
+        - window (int) - how many detections are collected before their hosts are looked up
+        """
+        if window < 1:
+            raise ValueError("window needs to be at least 1")
+        self.api = api
+        self.host_cache = host_cache if host_cache is not None else HostCache(api)
+        self.window = window
+
+    def _join(self, detections: list) -> list:
+        """ looks up the hosts for a window of detections and returns the joined records """
+        hosts = self.host_cache.get_many(device_id for device_id in map(detection_device_id, detections) if device_id)
+        return [dict(detection, **{ENRICHED_HOST_KEY : hosts.get(detection_device_id(detection))}) for detection in detections]
+
+    def enrich(self, detections):
+        """ yields each detection (from get_detections()) with the host record added as detection['host']
+
+        detections can be any iterable, ie a generator, the host's None if it couldn't be found
+        """
+        window = []
+        for detection in detections:
+            window.append(detection)
+            if len(window) >= self.window:
+                yield from self._join(window)
+                window = []
+        if window:
+            yield from self._join(window)
+
+    def enrich_ids(self, detection_ids, batch_size: int = ENTITY_BATCH_LIMITS['get_detections']):
+        """ hydrates detection IDs with get_detections() in batches, and yields them with their hosts """
+        def detections():
+            batch = []
+            for detection_id in detection_ids:
+                batch.append(detection_id)
+                if len(batch) >= batch_size:
+                    yield from self._hydrate(batch)
+                    batch = []
+            if batch:
+                yield from self._hydrate(batch)
+        yield from self.enrich(detections())
+
+    def _hydrate(self, ids: list) -> list:
+        """ returns the detection summaries for ids """
+        response = self.api.get_detections(ids=ids)
+        check_page_errors(response, "get_detections()")
+        logger.debug(f"Hydrated {len(ids)} detections")
+        return page_resources(response)
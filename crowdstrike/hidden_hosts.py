@@ -0,0 +1,126 @@
+""" keeps a local copy of the hidden host set, and hides/unhides only what's changed
+
+    hidden = HiddenHostSync('hidden_hosts.json')
+    hidden.sync(crowdstrike, desired=stale_host_ids)
+
+The first sync (or one with refresh=True) pulls the whole hidden set with hosts_hidden(). After that
+the local copy's trusted, so a run only costs the host_action_bulk() calls for the hosts that need
+to change state, in chunks of up to 100.
+
+The local copy drifts if hosts are hidden or unhidden some other way (the console, another script),
+and a drifted copy means hosts that should change get skipped. So it's only trusted for max_age
+seconds (four hours by default), after that the next sync() pulls the whole set again.
+"""
+
+import datetime
+import json
+
+from loguru import logger
+
+from .utilities import atomic_write, parse_timestamp
+
+# how long the local copy's trusted before sync() pulls the hidden set again, in seconds
+HIDDEN_HOSTS_MAX_AGE = 4 * 60 * 60
+
+class HiddenHostSync:
+    """ the locally-tracked set of hidden hosts, see the module docstring """
+    def __init__(self, path: str = None, max_age: float = HIDDEN_HOSTS_MAX_AGE):
+        """
+        - path (str) - the JSON file the hidden set's kept in, if it's None the set's only kept in memory
+        - max_age (float) - seconds the local copy's trusted for, None trusts it until refresh() is called
+        """
+        self.path = path
+        self.max_age = max_age
+        self.hidden = None
+        self.synced_at = None
+        self.load()
+
+    def load(self):
+        """ reads the hidden set from path, if it's there """
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'r') as file_handle:
+                state = json.load(file_handle)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            logger.warning(f"Ignoring unreadable hidden host file {self.path}: {error}")
+            return
+        self.hidden = set(state.get('hidden') or [])
+        self.synced_at = state.get('synced_at')
+
+    def save(self):
+        """ writes the hidden set to path """
+        if self.path is None or self.hidden is None:
+            return
+        atomic_write(self.path, json.dumps({
+            'synced_at' : self.synced_at,
+            'hidden' : sorted(self.hidden),
+        }))
+
+    def refresh(self, api) -> int:
+        """ pulls the full hidden set from the API, returns its size """
+        self.hidden = set(api.paginate('hosts_hidden'))
+        self.synced_at = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.save()
+        logger.debug(f"Pulled {len(self.hidden)} hidden hosts")
+        return len(self.hidden)
+
+    def is_stale(self) -> bool:
+        """ returns True if there's no local copy, or it's older than max_age """
+        if self.hidden is None or self.synced_at is None:
+            return True
+        if self.max_age is None:
+            return False
+        age = datetime.datetime.now(datetime.timezone.utc) - parse_timestamp(self.synced_at)
+        return age.total_seconds() > self.max_age
+
+    def diff(self, desired) -> dict:
+        """ returns {'hide_host' : [ids], 'unhide_host' : [ids]}, what needs to change to make desired the hidden set """
+        if self.hidden is None:
+            raise ValueError("There's no hidden host set yet, run refresh() first")
+        desired = set(desired)
+        return {
+            'hide_host' : sorted(desired - self.hidden),
+            'unhide_host' : sorted(self.hidden - desired),
+        }
+
+    def sync(self, api, desired, refresh: bool = False, dry_run: bool = False, **kwargs) -> dict:
+        """ hides and unhides hosts so the hidden set matches desired
+
+        - api (CrowdstrikeAPI) - the client to use
+        - desired (iterable) - the host IDs that should be hidden, every other host ends up unhidden
+        - refresh (bool) - pull the hidden set from the API first, this happens anyway if there's no local copy
+          or it's older than max_age
+        - dry_run (bool) - don't make the changes, just return them as { action_name : [ids] }
+
+        other arguments (batch_size, workers) are passed to host_action_bulk()
+
+        returns { action_name : { id : None if it worked, otherwise the error message } }, only the
+        hosts that worked are changed in the local set
+        """
+        if refresh or self.is_stale():
+            if not refresh and self.hidden is not None:
+                logger.debug(f"Hidden host set was pulled at {self.synced_at}, pulling it again")
+            self.refresh(api)
+        changes = {action_name : ids for action_name, ids in self.diff(desired).items() if ids}
+        logger.info(f"Hidden host sync: {len(changes.get('hide_host', []))} to hide, {len(changes.get('unhide_host', []))} to unhide")
+        if dry_run or not changes:
+            return changes
+
+        results = api.host_action_bulk(actions=changes, **kwargs)
+        for host_id, error in results.get('hide_host', {}).items():
+            if error is None:
+                self.hidden.add(host_id)
+        for host_id, error in results.get('unhide_host', {}).items():
+            if error is None:
+                self.hidden.discard(host_id)
+        self.save()
+        return results
+
+    def __len__(self):
+        return len(self.hidden or ())
+
+    def __contains__(self, host_id):
+        return host_id in (self.hidden or ())
@@ -2,6 +2,7 @@
 
 from loguru import logger
 
+from .batching import batched_entity_request, ENTITY_BATCH_LIMITS
 from .utilities import validate_kwargs
 
 def get_host_groups(self, **kwargs):
@@ -9,12 +10,14 @@ def get_host_groups(self, **kwargs):
     Returns a set of Host Groups which match the filter criteria
 
         ids: str (required)
-            - ids should be a list of strings
+            - ids should be a list of strings, large lists are requested in concurrent batches and merged
     """
     args_validation = {
         'ids' : list,
     }
     validate_kwargs(args_validation, kwargs, required=args_validation.keys())
+    if len(kwargs.get('ids')) > ENTITY_BATCH_LIMITS['get_host_groups']:
+        return batched_entity_request(lambda ids: self.get_host_groups(ids=ids), kwargs.get('ids'), ENTITY_BATCH_LIMITS['get_host_groups'])
 
     uri = '/devices/entities/host-groups/v1'
     method = 'get'
@@ -1,11 +1,37 @@
 """ handles interactions with the "hosts" category """
 
 import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from loguru import logger
 
+from .batching import batched_entity_request, ENTITY_BATCH_LIMITS
+from .pagination import check_page_errors, page_resources, page_total
+from .projection import project_page
 from .utilities import validate_kwargs
 
+# the scroll cursor expires two minutes after it's issued, it's renewed (by fetching the next page) well before that
+SCROLL_CURSOR_RENEW_AFTER = 90
+# how many pages scroll_host_ids() buffers ahead of the consumer before it starts waiting
+SCROLL_BUFFER_PAGES = 2
+# the most pages held on top of that while renewing the cursor for a slow consumer, past this the cursor's left to expire
+SCROLL_MAX_WAITING_PAGES = 20
+SCROLL_MAX_LIMIT = 5000
+
+# the most IDs hosts_detail() sends in one request, they go in the query string so there's a URL length limit
+HOSTS_DETAIL_MAX_IDS = ENTITY_BATCH_LIMITS['hosts_detail']
+# iter_hosts() defaults
+HYDRATE_WORKERS = 4
+
+# the most IDs host_action() takes in one request
+HOST_ACTION_MAX_IDS = ENTITY_BATCH_LIMITS['host_action']
+# how many host_action() calls host_action_bulk() runs at once
+HOST_ACTION_WORKERS = 4
+
 HOST_ACTION_NAMES = [
     'contain',
     'lift_containment',
@@ -46,27 +72,103 @@ def host_action(self, **kwargs):
     logger.debug(f"Request body: {response.request.body}")
     return response.json()
 
+def host_action_result(response: dict, ids: list) -> dict:
+    """ works out which of the ids in a host_action() call worked, returns { id : None or the error message } """
+    succeeded = {resource.get('id') for resource in response.get('resources') or [] if isinstance(resource, dict)}
+    errors = [error for error in response.get('errors') or [] if isinstance(error, dict)]
+    result = {}
+    for host_id in ids:
+        if host_id in succeeded:
+            result[host_id] = None
+            continue
+        # errors don't always say which host they're about, if none of them do the host gets all of them
+        matching = [error for error in errors if error.get('id') == host_id or host_id in str(error.get('message'))] or errors
+        result[host_id] = '; '.join(str(error.get('message')) for error in matching) or "No result returned for this host"
+    return result
+
+def host_action_bulk(self, **kwargs):
+    """ runs host actions on any number of hosts, in parallel chunks, and reports on each host
+
+    actions : dict (required) action_name : list of ids, ie {'contain' : [...], 'hide_host' : [...]}
+    batch_size : int - the IDs per request [1-100], defaults to 100
+    workers : int - how many requests to run at once, defaults to 4
+
+    Chunks are queued in HOST_ACTION_NAMES order, so containment goes out first.
+    Each request still goes through the rate limiter, and a failing chunk doesn't stop the others.
+
+    returns { action_name : { id : None if it worked, otherwise the error message } }
+    """
+    args_validation = {
+        'actions' : dict,
+        'batch_size' : int,
+        'workers' : int,
+    }
+    validate_kwargs(args_validation, kwargs, required=['actions'])
+    actions = kwargs.get('actions')
+    batch_size = kwargs.get('batch_size', HOST_ACTION_MAX_IDS)
+    workers = kwargs.get('workers', HOST_ACTION_WORKERS)
+    for action_name in actions:
+        if action_name not in HOST_ACTION_NAMES:
+            error_message = f"Invalid action_name={action_name} valid options are {','.join(HOST_ACTION_NAMES)}"
+            logger.error(error_message)
+            raise ValueError(error_message)
+    if not 1 <= batch_size <= HOST_ACTION_MAX_IDS:
+        raise ValueError(f"batch_size needs to be from 1-{HOST_ACTION_MAX_IDS}")
+    if workers < 1:
+        raise ValueError("workers needs to be at least 1")
+
+    def run(action_name: str, ids: list) -> dict:
+        try:
+            response = self.host_action(action_name=action_name, ids=ids)
+        except Exception as error: # pylint: disable=broad-except
+            logger.error(f"{action_name} failed for {len(ids)} hosts: {error}")
+            return {host_id : str(error) for host_id in ids}
+        return host_action_result(response, ids)
+
+    results = {action_name : {} for action_name in actions}
+    chunks = []
+    for action_name in sorted(actions, key=HOST_ACTION_NAMES.index):
+        # dict.fromkeys drops duplicates and keeps the order
+        ids = list(dict.fromkeys(actions[action_name]))
+        chunks.extend((action_name, ids[index:index + batch_size]) for index in range(0, len(ids), batch_size))
+    if not chunks:
+        return results
+    logger.debug(f"Running {len(chunks)} host action requests")
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks)), thread_name_prefix='crowdstrike-host-action') as executor:
+        futures = [(action_name, executor.submit(run, action_name, ids)) for action_name, ids in chunks]
+        for action_name, future in futures:
+            results[action_name].update(future.result())
+    return results
+
 def hosts_detail(self, **kwargs):
     """ Get details on one or more hosts by providing agent IDs (AID). You can get a host's agent IDs (AIDs) from the /devices/queries/devices/v1 endpoint, the Falcon console or the Streaming API
 
     arguments:
 
     - ids : list (list of Agent IDs: required)
+    - fields : list (optional) only keep these fields of each host, ie ['device_id', 'hostname', 'device_policies.prevention.policy_id']
+
+    if there's more than HOSTS_DETAIL_MAX_IDS, they're requested in concurrent batches and the responses merged
     """
     uri = '/devices/entities/devices/v1'
     method = 'get'
 
     args_validation = {
         'ids' : list,
+        'fields' : list,
     }
 
-    validate_kwargs(args_validation, kwargs, required=args_validation.keys())
+    validate_kwargs(args_validation, kwargs, required=['ids'])
+    if len(kwargs.get('ids')) > HOSTS_DETAIL_MAX_IDS:
+        extra = {'fields' : kwargs.get('fields')} if 'fields' in kwargs else {}
+        return batched_entity_request(lambda ids: self.hosts_detail(ids=ids, **extra), kwargs.get('ids'), HOSTS_DETAIL_MAX_IDS)
+    fields = kwargs.pop('fields', None)
 
     response = self.request(uri=uri,
                             request_method=method,
                             data=kwargs,
                             )
-    return response.json()
+    return project_page(response.json(), fields)
 
 
 
@@ -97,9 +199,122 @@ def hosts_hidden(self, **kwargs):
     return response.json()
 
 
-# GET
-# /devices/queries/devices-scroll/v1
-# Search for hosts in your environment by platform, hostname, IP, and other criteria with continuous pagination capability (based on offset pointer which expires after 2 minutes with no maximum limit)
+def hosts_query_devices_scroll(self, **kwargs):
+    """ Search for hosts in your environment by platform, hostname, IP, and other criteria with continuous pagination capability
+    (based on offset pointer which expires after 2 minutes with no maximum limit)
+
+    offset = The offset pointer from meta.pagination.offset of the previous response, leave it out for the first page
+    limit = The maximum records to return. [1-5000]
+    sort = The property to sort by (e.g. status.desc or hostname.asc)
+    filter = The filter expression that should be used to limit the results
+
+    returns the json object, resources are a list of host IDs
+    """
+    args_validation = {
+        'offset' : str,
+        'limit' : int,
+        'sort' : str,
+        'filter' : str,
+    }
+    validate_kwargs(args_validation, kwargs)
+
+    uri = '/devices/queries/devices-scroll/v1'
+    method = 'get'
+    response = self.request(uri=uri,
+                            request_method=method,
+                            data=kwargs,
+                            )
+    return response.json()
+
+def scroll_host_ids(self, **kwargs):
+    """ yields every host ID (AID) matching the filter, in one linear pass using the scroll endpoint
+
+    limit = The page size [1-5000], defaults to 5000
+    sort = The property to sort by (e.g. status.desc or hostname.asc)
+    filter = The filter expression that should be used to limit the results
+
+    Pages are fetched by a background thread, up to SCROLL_BUFFER_PAGES ahead of the consumer.
+    The scroll cursor expires two minutes after it's issued, so if the consumer's slower than that
+    the next page is fetched anyway (and held in memory) to keep the cursor alive. Once
+    SCROLL_MAX_WAITING_PAGES are held like that it stops renewing, and if the cursor expires the
+    error's raised to the consumer.
+    """
+    args_validation = {
+        'limit' : int,
+        'sort' : str,
+        'filter' : str,
+    }
+    validate_kwargs(args_validation, kwargs)
+    kwargs.setdefault('limit', SCROLL_MAX_LIMIT)
+    if not 1 <= kwargs.get('limit') <= SCROLL_MAX_LIMIT:
+        raise ValueError(f"limit needs to be from 1-{SCROLL_MAX_LIMIT}")
+
+    pages = queue.Queue(maxsize=SCROLL_BUFFER_PAGES)
+    stop = threading.Event()
+    finished = object()
+
+    def put(page, deadline: float = None) -> bool:
+        """ hands a page to the consumer, returns False if the deadline passed first """
+        while not stop.is_set():
+            timeout = 1.0 if deadline is None else min(1.0, deadline - time.monotonic())
+            if timeout <= 0:
+                return False
+            try:
+                pages.put(page, timeout=timeout)
+                return True
+            except queue.Full:
+                continue
+        return True
+
+    def producer():
+        cursor = None
+        seen = 0
+        waiting = deque()
+        warned = False
+        try:
+            while not stop.is_set():
+                query = dict(kwargs)
+                if cursor is not None:
+                    query['offset'] = cursor
+                page = self.hosts_query_devices_scroll(**query)
+                renew_at = time.monotonic() + SCROLL_CURSOR_RENEW_AFTER
+                check_page_errors(page, "Scrolling hosts")
+                resources = page_resources(page)
+                seen += len(resources)
+                total = page_total(page)
+                cursor = ((page.get('meta') or {}).get('pagination') or {}).get('offset')
+                if not resources or not cursor or (total is not None and seen >= total):
+                    cursor = None
+                waiting.append(resources)
+                while waiting and not stop.is_set():
+                    renew = cursor is not None and len(waiting) < SCROLL_MAX_WAITING_PAGES
+                    if cursor is not None and not renew and not warned:
+                        logger.warning(f"scroll_host_ids() consumer's too slow, {len(waiting)} pages are held in memory, "
+                                       "not renewing the scroll cursor any more so it may expire")
+                        warned = True
+                    if not put(waiting[0], deadline=renew_at if renew else None):
+                        logger.debug(f"Consumer's slow, renewing the scroll cursor ({len(waiting)} page(s) waiting)")
+                        break
+                    waiting.popleft()
+                if cursor is None and not waiting:
+                    break
+            put(finished)
+        except Exception as error: # pylint: disable=broad-except
+            put(error)
+
+    thread = threading.Thread(target=producer, name='crowdstrike-scroll', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+    finally:
+        stop.set()
+
 
 def hosts_query_devices(self, **kwargs):
     """ Search for hosts in your environment by platform, hostname, IP, and other criteria.
@@ -127,3 +342,63 @@ def hosts_query_devices(self, **kwargs):
                             data=kwargs,
                             )
     return response.json()
+
+def iter_hosts(self, **kwargs):
+    """ yields the full host record for every host matching the filter, streaming so memory use stays flat
+
+    filter = The filter expression that should be used to limit the results
+    sort = The property to sort by (e.g. status.desc or hostname.asc)
+    batch_size = How many hosts to hydrate per hosts_detail() call [1-100], defaults to 100
+    workers = How many hosts_detail() calls to run at once, defaults to 4
+    max_pending = How many batches can be in flight or waiting for the consumer, defaults to workers * 2
+    fields = Only keep these (dotted) fields of each host, see hosts_detail()
+
+    Host IDs come from scroll_host_ids() and are hydrated by hosts_detail() in batches on a worker pool.
+    Records come out in the order the IDs were found. Once max_pending batches are waiting, no more IDs
+    are read until the consumer catches up, so peak memory is a few batches rather than the whole fleet.
+    """
+    args_validation = {
+        'filter' : str,
+        'sort' : str,
+        'batch_size' : int,
+        'workers' : int,
+        'max_pending' : int,
+        'fields' : list,
+    }
+    validate_kwargs(args_validation, kwargs)
+    detail_kwargs = {'fields' : kwargs.pop('fields')} if 'fields' in kwargs else {}
+    batch_size = kwargs.pop('batch_size', HOSTS_DETAIL_MAX_IDS)
+    workers = kwargs.pop('workers', HYDRATE_WORKERS)
+    max_pending = kwargs.pop('max_pending', workers * 2)
+    if not 1 <= batch_size <= HOSTS_DETAIL_MAX_IDS:
+        raise ValueError(f"batch_size needs to be from 1-{HOSTS_DETAIL_MAX_IDS}")
+    if workers < 1 or max_pending < 1:
+        raise ValueError("workers and max_pending need to be at least 1")
+
+    def hydrate(ids: list) -> list:
+        response = self.hosts_detail(ids=ids, **detail_kwargs)
+        check_page_errors(response, "hosts_detail()")
+        return page_resources(response)
+
+    host_ids = self.scroll_host_ids(**kwargs)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crowdstrike-hydrate')
+    pending = deque()
+    try:
+        batch = []
+        for host_id in host_ids:
+            batch.append(host_id)
+            if len(batch) < batch_size:
+                continue
+            pending.append(executor.submit(hydrate, batch))
+            batch = []
+            while len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        if batch:
+            pending.append(executor.submit(hydrate, batch))
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        host_ids.close()
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -2,6 +2,7 @@
 
 from loguru import logger
 
+from .batching import batched_entity_request, ENTITY_BATCH_LIMITS
 from .utilities import validate_kwargs
 
 VALID_ACTION_KEYS = ['add_tag', 'delete_tag', 'update_name', 'update_description', 'update_status']
@@ -76,7 +77,7 @@ def incidents_get_details(self, **kwargs):
     returns the raw object so you can look for errors and pagination and so forth
 
     requires:
-    - ids (list) - a list of incident IDs
+    - ids (list) - a list of incident IDs, large lists are requested in concurrent batches and merged
 
     returns JSON data, response key has the following sub-keys: [
                         'incident_id', 'incident_type', 'cid',
@@ -93,6 +94,8 @@ def incidents_get_details(self, **kwargs):
         'ids' : list,
     }
     validate_kwargs(args_validation, kwargs, required=args_validation.keys())
+    if len(kwargs.get('ids')) > ENTITY_BATCH_LIMITS['incidents_get_details']:
+        return batched_entity_request(lambda ids: self.incidents_get_details(ids=ids), kwargs.get('ids'), ENTITY_BATCH_LIMITS['incidents_get_details'])
     response = self.request(uri=uri,
                             request_method=method,
                             data=kwargs,
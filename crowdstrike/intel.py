@@ -7,7 +7,6 @@ from loguru import logger
 from .utilities import validate_kwargs
 
 __all__ = ['get_intel_indicators']
-THIS_SHOULD_FAIL = "True"
 
 def get_intel_indicators(self, **kwargs):
     """ Get info about indicators that match provided FQL filters.
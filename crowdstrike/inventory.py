@@ -0,0 +1,319 @@
+""" local SQLite host inventory, for answering "which AID is hostname X / IP Y / MAC Z" without an API call
+
+    inventory = HostInventory('hosts.db')
+    inventory.refresh(crowdstrike)
+    inventory.by_hostname('WORKSTATION01')
+
+The first refresh() pulls every host, after that only hosts with a modified_timestamp at or after the
+last one seen are pulled. The database is a normal file, so opening it on process start is instant.
+
+changes() does the same pull, but yields what's changed since the last one, for feeding a CMDB (refresh()
+is changes() with the events thrown away, so use one or the other):
+
+    for event in inventory.changes(crowdstrike):
+        print(event['type'], event['device_id'], event['changed'])
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+
+from loguru import logger
+
+from .utilities import parse_timestamp
+
+# the host fields that get their own indexed column, the full record's kept as json too
+INDEXED_FIELDS = (
+    'hostname',
+    'local_ip',
+    'external_ip',
+    'mac_address',
+    'platform_name',
+    'agent_version',
+    'last_seen',
+)
+
+# how many records are written per transaction during refresh()
+REFRESH_COMMIT_EVERY = 1000
+
+# fields that change all the time without anything interesting happening, changes() ignores them
+# (the policy fields include applied_date, which moves every time a policy's re-applied)
+CHANGE_IGNORED_FIELDS = (
+    'last_seen',
+    'modified_timestamp',
+    'last_login_timestamp',
+    'policies',
+    'device_policies',
+    'meta',
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS hosts (
+    device_id TEXT PRIMARY KEY,
+    {', '.join(f'{field} TEXT' for field in INDEXED_FIELDS)},
+    modified_timestamp TEXT,
+    sync_id INTEGER,
+    content_hash TEXT,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inventory_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS hosts_hostname ON hosts (hostname COLLATE NOCASE);
+{''.join(f'CREATE INDEX IF NOT EXISTS hosts_{field} ON hosts ({field});' for field in INDEXED_FIELDS if field != 'hostname')}
+"""
+
+def normalise_mac(mac_address: str) -> str:
+    """ Crowdstrike formats MAC addresses as 00-50-56-a1-b2-c3 """
+    return mac_address.strip().lower().replace(':', '-').replace('.', '-')
+
+def content_hash(record: dict, ignored_fields: tuple = CHANGE_IGNORED_FIELDS) -> str:
+    """ hashes the parts of a host record changes() cares about """
+    content = {key : value for key, value in record.items() if key not in ignored_fields}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+def changed_fields(old: dict, new: dict, ignored_fields: tuple = CHANGE_IGNORED_FIELDS) -> dict:
+    """ returns { field : {'old' : value, 'new' : value} } for the top-level fields that differ """
+    changed = {}
+    for key in sorted(set(old) | set(new)):
+        if key in ignored_fields or old.get(key) == new.get(key):
+            continue
+        changed[key] = {'old' : old.get(key), 'new' : new.get(key)}
+    return changed
+
+class HostInventory:
+    """ a local, indexed copy of hosts_detail() output, see the module docstring """
+    def __init__(self, path: str = ':memory:'):
+        """ path is the SQLite database file, it's created if it doesn't exist """
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            if path != ':memory:':
+                self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.executescript(SCHEMA)
+            # databases from before changes() was added don't have the content_hash column
+            columns = [row['name'] for row in self.connection.execute('PRAGMA table_info(hosts)')]
+            if 'content_hash' not in columns:
+                self.connection.execute('ALTER TABLE hosts ADD COLUMN content_hash TEXT')
+
+    def close(self):
+        """ closes the database """
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_state(self, key: str) -> str:
+        """ returns a value from the inventory_state table, or None """
+        with self.lock:
+            row = self.connection.execute('SELECT value FROM inventory_state WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_state(self, key: str, value: str):
+        """ sets a value in the inventory_state table """
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO inventory_state (key, value) VALUES (?, ?)', (key, value))
+
+    @property
+    def watermark(self) -> str:
+        """ the newest modified_timestamp that's been stored """
+        return self.get_state('modified_timestamp')
+
+    def upsert(self, records: list, sync_id: int = None) -> int:
+        """ adds or updates host records (from hosts_detail()), returns how many were written """
+        rows = []
+        for record in records:
+            mac_address = record.get('mac_address')
+            rows.append((
+                record.get('device_id'),
+                *[normalise_mac(mac_address) if field == 'mac_address' and mac_address else record.get(field) for field in INDEXED_FIELDS],
+                record.get('modified_timestamp'),
+                sync_id,
+                content_hash(record),
+                json.dumps(record),
+            ))
+        placeholders = ', '.join('?' * (len(INDEXED_FIELDS) + 5))
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO hosts (device_id, {', '.join(INDEXED_FIELDS)}, modified_timestamp, sync_id, content_hash, record) VALUES ({placeholders})",
+                rows,
+            )
+        return len(rows)
+
+    def _refresh_filter(self, full: bool, filter_string: str, kwargs: dict) -> str:
+        """ sets kwargs['filter'] for a refresh, returns the watermark it used """
+        watermark = None if full else self.watermark
+        filters = [filter_string] if filter_string else []
+        if watermark:
+            # >= rather than > so hosts sharing the watermark's timestamp aren't missed, the upsert makes it safe
+            filters.append(f"modified_timestamp:>='{watermark}'")
+        if filters:
+            kwargs['filter'] = '+'.join(filters)
+        logger.debug(f"Refreshing host inventory, filter={kwargs.get('filter')}")
+        return watermark
+
+    def refresh(self, api, full: bool = False, filter_string: str = None, **kwargs) -> int:
+        """ pulls new and changed hosts from the API, returns the number of hosts updated
+
+        - api (CrowdstrikeAPI) - the client to use
+        - full (bool) - ignore the watermark and pull every host, removing any that have gone
+        - filter_string (str) - an extra FQL filter to limit the hosts kept in the inventory
+
+        any other arguments are passed to CrowdstrikeAPI.iter_hosts(), ie workers
+
+        this is changes() with the events thrown away, they share the watermark and the stored records,
+        so anything a refresh() pulls won't come out of the next changes()
+        """
+        events = self._sync(api, full, filter_string, False, kwargs)
+        while True:
+            try:
+                next(events)
+            except StopIteration as finished:
+                return finished.value
+
+    def _stored(self, device_ids: list) -> dict:
+        """ returns { device_id : (content_hash, record) } for the device_ids that are in the inventory """
+        stored = {}
+        with self.lock:
+            # sqlite has a limit on the number of parameters, so it's done in chunks
+            for index in range(0, len(device_ids), 500):
+                chunk = device_ids[index:index + 500]
+                rows = self.connection.execute(
+                    f"SELECT device_id, content_hash, record FROM hosts WHERE device_id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                stored.update({row['device_id'] : (row['content_hash'], row['record']) for row in rows})
+        return stored
+
+    def _removed(self, device_ids: list):
+        """ deletes hosts from the inventory and yields a removed event for each """
+        for index in range(0, len(device_ids), 500):
+            chunk = device_ids[index:index + 500]
+            records = self._stored(chunk)
+            for device_id in chunk:
+                yield {'type' : 'removed', 'device_id' : device_id, 'record' : json.loads(records[device_id][1]), 'changed' : {}}
+            with self.lock, self.connection:
+                self.connection.execute(f"DELETE FROM hosts WHERE device_id IN ({', '.join('?' * len(chunk))})", chunk)
+
+    def changes(self, api, full: bool = False, filter_string: str = None, detect_removed: bool = False, **kwargs):
+        """ pulls new and changed hosts like refresh(), and yields an event for each host that's actually changed
+
+        - api (CrowdstrikeAPI) - the client to use
+        - full (bool) - ignore the watermark and pull every host, hosts that have gone are yielded as removed
+        - filter_string (str) - an extra FQL filter to limit the hosts kept in the inventory
+        - detect_removed (bool) - list every host ID (not the details) with scroll_host_ids() to find removed hosts,
+          without doing a full pull
+
+        events look like {'type' : 'added'/'changed'/'removed', 'device_id' : str, 'record' : dict, 'changed' : dict}
+        where changed is { field : {'old' : value, 'new' : value} }. Fields in CHANGE_IGNORED_FIELDS
+        (ie last_seen) don't count as changes.
+
+        Each batch's events are yielded before it's saved, so if the consumer stops part way through,
+        the next call yields them again rather than losing them.
+        """
+        yield from self._sync(api, full, filter_string, detect_removed, kwargs)
+
+    def _sync(self, api, full: bool, filter_string: str, detect_removed: bool, kwargs: dict):
+        """ does the work for refresh() and changes(), yields the events and returns how many hosts were updated """
+        watermark = self._refresh_filter(full, filter_string, kwargs)
+        sync_id = int(self.get_state('sync_id') or 0) + 1
+
+        def batch_events(batch: list) -> list:
+            stored = self._stored([record.get('device_id') for record in batch])
+            events = []
+            for record in batch:
+                previous = stored.get(record.get('device_id'))
+                if previous is None:
+                    events.append({'type' : 'added', 'device_id' : record.get('device_id'), 'record' : record, 'changed' : {}})
+                    continue
+                stored_hash, stored_record = previous
+                if stored_hash is None:
+                    # stored before content_hash existed
+                    stored_hash = content_hash(json.loads(stored_record))
+                if stored_hash != content_hash(record):
+                    changed = changed_fields(json.loads(stored_record), record)
+                    events.append({'type' : 'changed', 'device_id' : record.get('device_id'), 'record' : record, 'changed' : changed})
+            return events
+
+        updated = 0
+        newest = watermark
+        # compared as times, the strings don't sort when the fractional seconds vary
+        newest_time = parse_timestamp(watermark) if watermark else None
+        batch = []
+        for record in api.iter_hosts(**kwargs):
+            batch.append(record)
+            if record.get('modified_timestamp'):
+                modified = parse_timestamp(record.get('modified_timestamp'))
+                if newest_time is None or modified > newest_time:
+                    newest, newest_time = record.get('modified_timestamp'), modified
+            if len(batch) >= REFRESH_COMMIT_EVERY:
+                yield from batch_events(batch)
+                updated += self.upsert(batch, sync_id=sync_id)
+                batch = []
+        if batch:
+            yield from batch_events(batch)
+            updated += self.upsert(batch, sync_id=sync_id)
+
+        if full:
+            with self.lock:
+                gone = [row['device_id'] for row in self.connection.execute('SELECT device_id FROM hosts WHERE sync_id IS NOT ?', (sync_id,))]
+            yield from self._removed(gone)
+        elif detect_removed:
+            scroll_kwargs = {'filter' : filter_string} if filter_string else {}
+            current = set(api.scroll_host_ids(**scroll_kwargs))
+            with self.lock:
+                gone = [row['device_id'] for row in self.connection.execute('SELECT device_id FROM hosts') if row['device_id'] not in current]
+            yield from self._removed(gone)
+
+        self.set_state('sync_id', str(sync_id))
+        if newest:
+            self.set_state('modified_timestamp', newest)
+        logger.debug(f"Updated {updated} hosts, watermark is now {newest}")
+        return updated
+
+    def _query(self, where: str, params: tuple) -> list:
+        """ returns the records matching the where clause """
+        with self.lock:
+            rows = self.connection.execute(f"SELECT record FROM hosts WHERE {where}", params).fetchall()
+        return [json.loads(row['record']) for row in rows]
+
+    def get(self, device_id: str) -> dict:
+        """ returns the record for a device_id, or None """
+        records = self._query('device_id = ?', (device_id,))
+        return records[0] if records else None
+
+    def by_hostname(self, hostname: str) -> list:
+        """ returns the hosts with this hostname, case insensitive """
+        return self._query('hostname = ? COLLATE NOCASE', (hostname,))
+
+    def by_ip(self, ip_address: str) -> list:
+        """ returns the hosts with this local or external IP """
+        return self._query('local_ip = ? UNION ALL SELECT record FROM hosts WHERE external_ip = ? AND local_ip IS NOT ?', (ip_address, ip_address, ip_address))
+
+    def by_mac(self, mac_address: str) -> list:
+        """ returns the hosts with this MAC address, any of the usual formats work """
+        return self._query('mac_address = ?', (normalise_mac(mac_address),))
+
+    def by_platform(self, platform_name: str) -> list:
+        """ returns the hosts on this platform, ie Windows """
+        return self._query('platform_name = ?', (platform_name,))
+
+    def by_agent_version(self, agent_version: str) -> list:
+        """ returns the hosts running this sensor version """
+        return self._query('agent_version = ?', (agent_version,))
+
+    def last_seen_before(self, timestamp: str) -> list:
+        """ returns the hosts that haven't been seen since timestamp (ie 2021-01-01T00:00:00Z) """
+        return self._query('last_seen < ?', (timestamp,))
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM hosts').fetchone()[0]
@@ -0,0 +1,192 @@
+""" walks the pages of the offset/limit query endpoints
+
+    for host_id in crowdstrike.paginate('hosts_query_devices', filter="platform_name:'Windows'"):
+        ...
+
+Pages are requested as the iterator's consumed, so only one page is held in memory at a time.
+With prefetch=N, up to N pages are requested concurrently ahead of the consumer (and held in
+memory), results still come out in order.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from .projection import project_page
+
+# endpoint : the largest page it'll return
+PAGINATION_LIMITS = {
+    'hosts_query_devices' : 5000,
+    'hosts_hidden' : 5000,
+    'get_detects' : 9999,
+    'incidents_query' : 500,
+    'search_host_groups' : 500,
+    'list_rtr_session_ids' : 1000,
+    'search_rtr_scripts' : 500,
+    # the documented maximum is 50000, but these are full indicator objects rather than IDs
+    'get_intel_indicators' : 5000,
+}
+
+SENSOR_INSTALLER_LIMIT = 500
+
+def page_resources(page) -> list:
+    """ returns the resources from a page, some endpoints (ie incidents_query) only return the list """
+    if isinstance(page, list):
+        return page
+    return page.get('resources') or []
+
+def page_total(page) -> int:
+    """ returns meta.pagination.total from a page, or None if it's not there """
+    if not isinstance(page, dict):
+        return None
+    return ((page.get('meta') or {}).get('pagination') or {}).get('total')
+
+def check_page_errors(page, description: str):
+    """ raises a RuntimeError if the page came back with errors and no resources """
+    if isinstance(page, dict) and page.get('errors') and not page.get('resources'):
+        raise RuntimeError(f"{description} failed: {page.get('errors')}")
+
+def iter_offset_pages(fetch, limit: int, offset: int = 0):
+    """ yields each page from fetch(offset=offset, limit=limit) until the results run out
+
+    the last page is detected from meta.pagination.total, or a short page if there's no total
+    """
+    while True:
+        page = fetch(offset=offset, limit=limit)
+        check_page_errors(page, f"Query at offset={offset}")
+        resources = page_resources(page)
+        total = page_total(page)
+        yield page
+        offset += len(resources)
+        if not resources:
+            break
+        if total is not None and offset >= total:
+            break
+        if total is None and len(resources) < limit:
+            break
+
+def iter_cursor_pages(fetch, next_cursor, cursor=None, speculative: bool = True):
+    """ yields each page from fetch(cursor), next_cursor(page, cursor) returns the next cursor or None when it's done
+
+    for scroll/cursor style pagination, where the next position isn't known until a page comes back.
+    If speculative is True, the next page is requested as soon as the current one arrives,
+    so it's in flight while the consumer's working through the current page.
+    """
+    if not speculative:
+        while True:
+            page = fetch(cursor)
+            check_page_errors(page, f"Query at cursor={cursor}")
+            cursor = next_cursor(page, cursor)
+            yield page
+            if cursor is None:
+                break
+        return
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='crowdstrike-prefetch')
+    try:
+        future = executor.submit(fetch, cursor)
+        while future is not None:
+            page = future.result()
+            check_page_errors(page, f"Query at cursor={cursor}")
+            cursor = next_cursor(page, cursor)
+            future = executor.submit(fetch, cursor) if cursor is not None else None
+            yield page
+    finally:
+        if future is not None:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+def iter_offset_pages_prefetch(fetch, limit: int, offset: int = 0, window: int = 4):
+    """ like iter_offset_pages(), but requests up to window pages concurrently
+
+    once the first page says how many results there are, the rest of the offsets are known,
+    so they're fetched concurrently and yielded in order. If there's no total, it falls back
+    to speculatively fetching the next page while the current one's being consumed.
+    """
+    first_page = fetch(offset=offset, limit=limit)
+    check_page_errors(first_page, f"Query at offset={offset}")
+    first_count = len(page_resources(first_page))
+    total = page_total(first_page)
+    yield first_page
+    if first_count == 0 or (total is None and first_count < limit):
+        return
+
+    next_offset = offset + first_count
+    if total is None:
+        def next_cursor(page, page_offset):
+            resources = page_resources(page)
+            if len(resources) < limit:
+                return None
+            return page_offset + len(resources)
+
+        def fetch_cursor(page_offset):
+            return fetch(offset=page_offset, limit=limit)
+
+        yield from iter_cursor_pages(fetch_cursor, next_cursor, cursor=next_offset)
+        return
+
+    # the server can cap the page size below limit, so the offsets step by what the first page actually held
+    step = first_count
+    offsets = iter(range(next_offset, total, step))
+    executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix='crowdstrike-prefetch')
+    pending = deque()
+    try:
+        for page_offset in offsets:
+            pending.append((page_offset, executor.submit(fetch, offset=page_offset, limit=limit)))
+            if len(pending) >= window:
+                break
+        while pending:
+            page_offset, future = pending.popleft()
+            page = future.result()
+            check_page_errors(page, f"Query at offset={page_offset}")
+            count = len(page_resources(page))
+            if count < min(step, total - page_offset):
+                # a short page that isn't the last one, so the offsets after it are off, page through the rest
+                for _, future in pending:
+                    future.cancel()
+                pending.clear()
+                yield page
+                if count:
+                    yield from iter_offset_pages(fetch, limit, offset=page_offset + count)
+                return
+            next_page_offset = next(offsets, None)
+            if next_page_offset is not None:
+                pending.append((next_page_offset, executor.submit(fetch, offset=next_page_offset, limit=limit)))
+            yield page
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+def paginate(self, endpoint: str, **kwargs):
+    """ yields every resource from one of the query endpoints, fetching pages as they're needed
+
+    - endpoint (str) - the name of the endpoint, one of the keys of PAGINATION_LIMITS
+    - limit (int) - the page size, defaults to the largest the endpoint allows
+    - offset (int) - where to start, defaults to 0
+    - prefetch (int) - the number of pages to request concurrently, defaults to 0 (one at a time)
+    - fields (list) - for endpoints that return objects rather than IDs, only keep these (dotted) fields
+
+    any other arguments (filter, sort etc) are passed to the endpoint
+    """
+    if endpoint not in PAGINATION_LIMITS:
+        raise ValueError(f"Can't paginate {endpoint}, should be one of {','.join(PAGINATION_LIMITS)}")
+    function = getattr(self, endpoint)
+    limit = kwargs.pop('limit', PAGINATION_LIMITS[endpoint])
+    offset = kwargs.pop('offset', 0)
+    prefetch = kwargs.pop('prefetch', 0)
+    fields = kwargs.pop('fields', None)
+    if not isinstance(limit, int) or not 1 <= limit <= PAGINATION_LIMITS[endpoint]:
+        raise ValueError(f"limit for {endpoint} should be from 1-{PAGINATION_LIMITS[endpoint]}")
+
+    def fetch(offset: int, limit: int):
+        logger.debug(f"Fetching {endpoint} offset={offset} limit={limit}")
+        return function(offset=offset, limit=limit, **kwargs)
+
+    if prefetch:
+        pages = iter_offset_pages_prefetch(fetch, limit=limit, offset=offset, window=prefetch)
+    else:
+        pages = iter_offset_pages(fetch, limit=limit, offset=offset)
+    for page in pages:
+        yield from page_resources(project_page(page, fields))
@@ -0,0 +1,48 @@
+""" trims API records down to the fields you ask for
+
+    crowdstrike.hosts_detail(ids=ids, fields=['device_id', 'hostname', 'device_policies.prevention.policy_id'])
+
+Fields are dotted paths into the record, lists of objects are projected item by item. Fields that
+aren't in a record are left out rather than set to None. Each page is projected as soon as it's
+decoded, so only one page of full records is held at a time.
+"""
+
+def compile_fields(fields: list) -> dict:
+    """ turns ['a', 'b.c', 'b.d'] into {'a' : {}, 'b' : {'c' : {}, 'd' : {}}}, an empty dict means keep the whole value """
+    if not isinstance(fields, (list, tuple)) or not all(isinstance(field, str) and field for field in fields):
+        raise TypeError("fields should be a list of (dotted) field names")
+    tree = {}
+    for field in fields:
+        node = tree
+        parts = field.split('.')
+        for index, part in enumerate(parts):
+            if part in node and not node[part]:
+                # a parent's already being kept whole
+                break
+            if index == len(parts) - 1:
+                node[part] = {}
+            else:
+                node = node.setdefault(part, {})
+    return tree
+
+def project(record, tree: dict):
+    """ returns a copy of record with only the fields in tree (from compile_fields()) """
+    if not tree:
+        return record
+    if isinstance(record, list):
+        return [project(item, tree) for item in record]
+    if not isinstance(record, dict):
+        return record
+    return {key : project(record[key], subtree) for key, subtree in tree.items() if key in record}
+
+def project_page(page, fields: list):
+    """ projects the resources in an API response in place, and returns it """
+    if not fields:
+        return page
+    tree = compile_fields(fields)
+    # some endpoints (ie incidents_query) only return the list
+    if isinstance(page, list):
+        return [project(resource, tree) for resource in page]
+    if page.get('resources'):
+        page['resources'] = [project(resource, tree) for resource in page['resources']]
+    return page
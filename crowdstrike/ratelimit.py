@@ -0,0 +1,126 @@
+""" client-side rate limiting, driven by the X-RateLimit-* response headers
+
+Crowdstrike returns the following headers on every response:
+
+    X-RateLimit-Limit : Request limit per minute.
+    X-RateLimit-Remaining : The number of requests remaining for the sliding 1 minute window.
+
+and on a 429 it'll add Retry-After (seconds) and/or X-RateLimit-RetryAfter (epoch seconds).
+"""
+
+import threading
+import time
+
+from loguru import logger
+
+# the documented default for an API client, it'll be replaced by the header value after the first response
+DEFAULT_RATE_LIMIT = 6000
+RATE_LIMIT_WINDOW = 60.0
+# how much of the per-minute budget is allowed to go out as a burst
+DEFAULT_BURST_FRACTION = 0.1
+
+class RateLimiter:
+    """ token bucket that sits in front of CrowdstrikeAPI.do_request()
+
+    The bucket holds up to `burst` tokens and refills so that burst + refill never exceeds
+    the per-minute limit over the sliding window, so calls are paced across the whole minute
+    instead of going out in a burst and then eating 429s.
+
+    Wait statistics are kept in total_wait (seconds), last_wait (seconds) and waited_calls.
+    """
+    def __init__(self,
+                 limit: int = DEFAULT_RATE_LIMIT,
+                 window: float = RATE_LIMIT_WINDOW,
+                 burst_fraction: float = DEFAULT_BURST_FRACTION,
+                 ):
+        self.window = window
+        self.burst_fraction = burst_fraction
+        self.lock = threading.Lock()
+        self.limit = 0
+        self.burst = 0.0
+        self.rate = 0.0
+        self._set_limit(limit)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+        self.total_wait = 0.0
+        self.last_wait = 0.0
+        self.waited_calls = 0
+
+    def _set_limit(self, limit: int):
+        """ recalculates the bucket size and refill rate, call with the lock held """
+        self.limit = max(1, int(limit))
+        self.burst = max(1.0, self.limit * self.burst_fraction)
+        self.rate = max(self.limit - self.burst, 1.0) / self.window
+
+    def _refill(self, now: float):
+        """ tops up the bucket based on the time since the last refill, call with the lock held """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """ blocks until a request is allowed to go out, returns the number of seconds it waited """
+        start = time.monotonic()
+        slept = False
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    sleep_for = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    waited = now - start if slept else 0.0
+                    self.last_wait = waited
+                    if slept:
+                        self.total_wait += waited
+                        self.waited_calls += 1
+                    return waited
+                else:
+                    sleep_for = (1 - self.tokens) / self.rate
+            time.sleep(sleep_for)
+            slept = True
+
+    def update(self, headers) -> None:
+        """ learns the current budget from the response headers """
+        limit = headers.get('X-RateLimit-Limit')
+        remaining = headers.get('X-RateLimit-Remaining')
+        with self.lock:
+            if limit is not None and limit.isdigit() and int(limit) != self.limit:
+                logger.debug(f"Rate limit changed from {self.limit} to {limit} per {self.window}s")
+                self._set_limit(int(limit))
+            if remaining is not None and remaining.isdigit():
+                # the server's view wins if it's lower, ie other clients are sharing the budget
+                self.tokens = min(self.tokens, float(remaining))
+
+    def backoff(self, headers) -> float:
+        """ handles a 429, blocks all callers until the server says we can go again
+
+        returns the number of seconds until requests are allowed again
+        """
+        delay = None
+        retry_after = headers.get('Retry-After')
+        retry_at = headers.get('X-RateLimit-RetryAfter')
+        if retry_after is not None and retry_after.isdigit():
+            delay = float(retry_after)
+        elif retry_at is not None and retry_at.isdigit():
+            delay = max(0.0, int(retry_at) - time.time())
+        with self.lock:
+            if delay is None:
+                # no hint from the server, wait long enough for a single token
+                delay = 1 / self.rate
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        logger.debug(f"Got rate limited, holding requests for {delay:.2f}s")
+        return delay
+
+    def stats(self) -> dict:
+        """ returns the wait statistics """
+        with self.lock:
+            return {
+                'limit' : self.limit,
+                'total_wait' : self.total_wait,
+                'last_wait' : self.last_wait,
+                'waited_calls' : self.waited_calls,
+            }
@@ -0,0 +1,164 @@
+""" resolves hostnames and IPs to host IDs (AIDs) quickly, for containment workflows
+
+    resolver = HostResolver(crowdstrike)
+    resolver.warm()
+    ...
+    resolver.contain_hostnames(['WORKSTATION01', 'laptop02'])
+
+Lookups for many hosts are batched into one FQL query (ie hostname:['a','b']) and one hosts_detail() call,
+rather than a query and a detail call per host. Answers are cached briefly, including "not found" so a
+typo doesn't get looked up over and over.
+"""
+
+import threading
+import time
+
+from loguru import logger
+
+from .cache import LRUCache
+from .pagination import check_page_errors, page_resources
+
+# the host fields you can resolve by
+RESOLVABLE_FIELDS = ('hostname', 'local_ip', 'external_ip')
+# the most values in one FQL filter, it goes in the query string so it's kept short
+RESOLVE_BATCH_SIZE = 100
+
+DEFAULT_RESOLVER_TTL = 60
+DEFAULT_RESOLVER_NEGATIVE_TTL = 15
+DEFAULT_RESOLVER_CACHE_SIZE = 10000
+
+def fql_quote(value: str) -> str:
+    """ quotes a value for an FQL filter """
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+class HostResolver:
+    """ maps hostnames/IPs to host IDs with batched lookups and a short-lived cache, see the module docstring """
+    def __init__(self,
+                 api,
+                 ttl: float = DEFAULT_RESOLVER_TTL,
+                 negative_ttl: float = DEFAULT_RESOLVER_NEGATIVE_TTL,
+                 maxsize: int = DEFAULT_RESOLVER_CACHE_SIZE,
+                 ):
+        """
+        - api (CrowdstrikeAPI) - the client to use
+        - ttl (float) - seconds to remember a host ID for
+        - negative_ttl (float) - seconds to remember that nothing matched
+        - maxsize (int) - the most answers to keep
+        """
+        self.api = api
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache = LRUCache(maxsize=maxsize)
+        # resolvers get shared between threads, so the counters are updated with this held
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def warm(self):
+        """ gets a token and opens a pooled connection, so the first real lookup doesn't pay for either """
+        started = time.monotonic()
+        self.api.ensure_token()
+        self.api.hosts_query_devices(limit=1)
+        logger.debug(f"Resolver warmed up in {time.monotonic() - started:.3f}s")
+
+    def _lookup(self, field: str, values: list) -> dict:
+        """ queries the API for values, returns { lowercased value : [device_ids] } """
+        found = {value.lower() : [] for value in values}
+        for index in range(0, len(values), RESOLVE_BATCH_SIZE):
+            batch = values[index:index + RESOLVE_BATCH_SIZE]
+            query_filter = f"{field}:[{','.join(fql_quote(value) for value in batch)}]"
+            # a common hostname (or a NAT'd external IP) can match more hosts than fit in a page
+            ids = list(self.api.paginate('hosts_query_devices', filter=query_filter))
+            if not ids:
+                continue
+            # the query only returns IDs, so the details say which host matched which value
+            details = self.api.hosts_detail(ids=ids, fields=['device_id', field])
+            check_page_errors(details, f"Resolving {field}")
+            for host in page_resources(details):
+                matched = str(host.get(field) or '').lower()
+                if matched in found:
+                    found[matched].append(host.get('device_id'))
+        return found
+
+    def resolve(self, field: str, values: list) -> dict:
+        """ returns { value : [device_ids] } for each value, an empty list means nothing matched
+
+        matching's case insensitive, and more than one host can share a hostname or IP
+        """
+        if field not in RESOLVABLE_FIELDS:
+            raise ValueError(f"Can't resolve by {field}, should be one of {','.join(RESOLVABLE_FIELDS)}")
+        if not isinstance(values, list):
+            raise TypeError(f"values should be of type 'list', got '{type(values)}'")
+
+        result = {}
+        missing = {}
+        hits = 0
+        for value in values:
+            cached = self.cache.get((field, value.lower()))
+            if cached is not None:
+                hits += 1
+                result[value] = list(cached[0])
+            elif value.lower() not in missing:
+                missing[value.lower()] = value
+        with self.lock:
+            self.hits += hits
+            self.misses += len(missing)
+        if missing:
+            logger.debug(f"Resolving {len(missing)} {field} value(s), {len(result)} cached")
+            found = self._lookup(field, list(missing.values()))
+            for key, ids in found.items():
+                self.cache.set((field, key), ids, ttl=self.ttl if ids else self.negative_ttl)
+            for value in values:
+                if value not in result:
+                    result[value] = list(found.get(value.lower(), []))
+        return result
+
+    def resolve_hostnames(self, hostnames: list) -> dict:
+        """ returns { hostname : [device_ids] } """
+        return self.resolve('hostname', hostnames)
+
+    def resolve_ips(self, ip_addresses: list, field: str = 'local_ip') -> dict:
+        """ returns { ip address : [device_ids] }, field can be local_ip or external_ip """
+        return self.resolve(field, ip_addresses)
+
+    def forget(self, field: str = None, value: str = None):
+        """ drops a cached answer, or everything if field and value aren't given """
+        if field is None:
+            self.cache.clear()
+        else:
+            self.cache.delete((field, value.lower()))
+
+    def contain(self, field: str, values: list, **kwargs) -> dict:
+        """ resolves the values and contains every matching host
+
+        returns {'resolved' : {value : [device_ids]}, 'unresolved' : [values], 'results' : {device_id : None or the error message}}
+        other arguments (batch_size, workers) are passed to host_action_bulk()
+        """
+        resolved = self.resolve(field, values)
+        ids = [device_id for device_ids in resolved.values() for device_id in device_ids]
+        unresolved = [value for value, device_ids in resolved.items() if not device_ids]
+        if unresolved:
+            logger.warning(f"Couldn't find hosts for {field}: {','.join(unresolved)}")
+        results = self.api.host_action_bulk(actions={'contain' : ids}, **kwargs).get('contain') if ids else {}
+        return {
+            'resolved' : {value : device_ids for value, device_ids in resolved.items() if device_ids},
+            'unresolved' : unresolved,
+            'results' : results,
+        }
+
+    def contain_hostnames(self, hostnames: list, **kwargs) -> dict:
+        """ contains the hosts with these hostnames, see contain() """
+        return self.contain('hostname', hostnames, **kwargs)
+
+    def contain_ips(self, ip_addresses: list, field: str = 'local_ip', **kwargs) -> dict:
+        """ contains the hosts with these IPs, see contain() """
+        return self.contain(field, ip_addresses, **kwargs)
+
+    def stats(self) -> dict:
+        """ returns the cache statistics """
+        with self.lock:
+            return {
+                'size' : len(self.cache),
+                'hits' : self.hits,
+                'misses' : self.misses,
+            }
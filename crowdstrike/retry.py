@@ -0,0 +1,126 @@
+""" retry policy for CrowdstrikeAPI.request()
+
+Requests that are safe to replay (reads, and the POST /GET/ entity lookups) are retried on
+connection errors, timeouts and 5xx responses with jittered exponential backoff.
+Everything else (host_action, incidents_perform_actions, etc) is only retried if the
+connection failed before the request was sent, so an action never gets applied twice.
+"""
+
+import random
+import threading
+import time
+
+from loguru import logger
+
+# HTTP methods that don't change anything
+IDEMPOTENT_METHODS = ('get', 'head', 'options')
+
+# response codes that mean "try again later", 429's handled separately by the rate limiter (within the deadline)
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+class RetryPolicy:
+    """ decides when and how long to wait before replaying a failed request
+
+    - max_retries (int) - the maximum number of retries for a single request
+    - backoff_base (float) - the first backoff is up to this many seconds, doubling each retry
+    - backoff_max (float) - the cap on a single backoff
+    - attempt_timeout (float) - seconds to wait for a single attempt
+    - deadline (float) - seconds a request (including all its retries) is allowed to take
+    - safe_uris (list) - extra non-GET URIs that are safe to replay
+
+    Retry statistics are available from stats().
+    """
+    def __init__(self,
+                 max_retries: int = 4,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0,
+                 attempt_timeout: float = 60.0,
+                 deadline: float = 300.0,
+                 safe_uris: list = None,
+                 ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.safe_uris = set(safe_uris or [])
+
+        self.lock = threading.Lock()
+        self.total_retries = 0
+        self.retried_requests = 0
+        self.gave_up = 0
+
+    def is_idempotent(self, request_method: str, uri: str) -> bool:
+        """ returns True if the request can be replayed without side effects """
+        request_method = (request_method or 'get').lower()
+        if request_method in IDEMPOTENT_METHODS:
+            return True
+        # entity lookups that POST a list of IDs, eg /detects/entities/summaries/GET/v1
+        if request_method == 'post' and '/GET/' in uri:
+            return True
+        return uri in self.safe_uris
+
+    def timeout(self, started: float) -> float:
+        """ the timeout for the next attempt, so it doesn't run past the overall deadline """
+        remaining = self.deadline - (time.monotonic() - started)
+        return max(0.1, min(self.attempt_timeout, remaining))
+
+    def backoff(self, retries: int) -> float:
+        """ full jitter exponential backoff """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** retries)))
+
+    def _can_retry(self, retries: int, started: float, backoff: float) -> bool:
+        """ checks the retry count and the deadline """
+        if retries >= self.max_retries:
+            return False
+        return (time.monotonic() - started) + backoff < self.deadline
+
+    def retry_error(self, request_method: str, uri: str, error: Exception, retries: int, started: float) -> float:
+        """ returns the number of seconds to back off for if the request should be retried after error, otherwise None """
+        from requests.exceptions import ConnectionError as RequestsConnectionError, ConnectTimeout, Timeout # pylint: disable=import-outside-toplevel
+        if self.is_idempotent(request_method, uri):
+            retryable = isinstance(error, (RequestsConnectionError, Timeout))
+        else:
+            # the request never made it to the server, so it's safe to send again
+            retryable = isinstance(error, ConnectTimeout)
+        return self._retry_backoff(retryable, request_method, uri, retries, started, repr(error))
+
+    def retry_response(self, request_method: str, uri: str, status_code: int, retries: int, started: float) -> float:
+        """ returns the number of seconds to back off for if the request should be retried after getting status_code, otherwise None """
+        retryable = status_code in RETRY_STATUS_CODES and self.is_idempotent(request_method, uri)
+        return self._retry_backoff(retryable, request_method, uri, retries, started, f"HTTP {status_code}")
+
+    def retry_rate_limited(self, request_method: str, uri: str, delay: float, started: float) -> bool:
+        """ returns True if there's time to wait out a 429 for delay seconds and try again, 429s count against the deadline too """
+        if (time.monotonic() - started) + delay < self.deadline:
+            return True
+        logger.debug(f"Giving up on {request_method} {uri}, it's rate limited for {delay:.2f}s and that's past the deadline")
+        with self.lock:
+            self.gave_up += 1
+        return False
+
+    def _retry_backoff(self, retryable: bool, request_method: str, uri: str, retries: int, started: float, reason: str) -> float:
+        """ works out the backoff and keeps the stats """
+        if not retryable:
+            return None
+        backoff = self.backoff(retries)
+        if not self._can_retry(retries, started, backoff):
+            logger.debug(f"Giving up on {request_method} {uri} after {retries} retries ({reason})")
+            with self.lock:
+                self.gave_up += 1
+            return None
+        logger.debug(f"Retrying {request_method} {uri} in {backoff:.2f}s ({reason})")
+        with self.lock:
+            self.total_retries += 1
+            if retries == 0:
+                self.retried_requests += 1
+        return backoff
+
+    def stats(self) -> dict:
+        """ returns the retry statistics """
+        with self.lock:
+            return {
+                'total_retries' : self.total_retries,
+                'retried_requests' : self.retried_requests,
+                'gave_up' : self.gave_up,
+            }
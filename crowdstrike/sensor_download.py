@@ -4,6 +4,8 @@ import errno
 
 from loguru import logger
 
+from .pagination import iter_offset_pages, page_resources, SENSOR_INSTALLER_LIMIT
+
 def download_sensor(self, sensorid: str, destination_filename: str):
     """ downloads a sensor id to the filename """
     uri = '/sensors/entities/download-installer/v1'
@@ -84,23 +86,26 @@ def get_sensor_installer_details(self, sensorid: str):
 
 def get_sensor_installer_ids(self, sort_string: str = "", filter_string: str = ""):
     """
-    returns a list of installer IDs, they're a list of SHA256's
+    returns a list of installer IDs, they're a list of SHA256's, or False if there aren't any
     """
     logger.debug(f"sort_string: '{sort_string}', filter_string: '{filter_string}'")
     uri = '/sensors/queries/installers/v1'
 
-    data = {
-        'sort' : sort_string,
-        'filter' : filter_string,
-    }
-
-    response = self.request(request_method='get', uri=uri, data=data)
-    #logger.debug(response.json())
-    logger.debug("Request headers")
-    logger.debug(response.request.headers)
-    #logger.debug(dir(response))
-    response.raise_for_status()
-
-
-    # TODO: handle pagination
-    return response.json().get('resources', False)
+    def fetch(offset: int, limit: int):
+        data = {
+            'sort' : sort_string,
+            'filter' : filter_string,
+            'offset' : offset,
+            'limit' : limit,
+        }
+        response = self.request(request_method='get', uri=uri, data=data)
+        logger.debug("Request headers")
+        logger.debug(response.request.headers)
+        response.raise_for_status()
+        return response.json()
+
+    installer_ids = []
+    for page in iter_offset_pages(fetch, limit=SENSOR_INSTALLER_LIMIT):
+        installer_ids.extend(page_resources(page))
+    # it's always returned False when nothing matched, callers check for that
+    return installer_ids or False
@@ -0,0 +1,210 @@
+""" columnar, numpy-backed snapshot of the fleet for fast analytics
+
+    snapshot = FleetSnapshot.from_client(crowdstrike)
+    snapshot.count_by('os_version')
+    stale = snapshot.stale(days=30)
+    snapshot.host_action(crowdstrike, 'hide_host', stale)
+
+Strings are dictionary-encoded (an int32 code per host, plus the list of distinct values), timestamps
+are datetime64[s] and device IDs are fixed-width bytes, so 300k hosts takes tens of megabytes rather
+than gigabytes of dicts, and filtering/counting runs as vectorised numpy operations.
+
+numpy's an optional dependency, install it with `pip install crowdstrike[snapshot]`.
+"""
+
+import datetime
+
+from loguru import logger
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# host fields that are stored dictionary-encoded
+STRING_COLUMNS = (
+    'hostname',
+    'platform_name',
+    'os_version',
+    'agent_version',
+    'status',
+    'product_type_desc',
+    'machine_domain',
+    'site_name',
+)
+# host fields that are stored as datetime64[s]
+TIMESTAMP_COLUMNS = (
+    'first_seen',
+    'last_seen',
+    'modified_timestamp',
+)
+# AIDs are 32 hex characters
+DEVICE_ID_DTYPE = 'S32'
+
+# how many records from_client() collects before converting them to arrays
+SNAPSHOT_CHUNK_SIZE = 5000
+
+def require_numpy():
+    """ raises ImportError if numpy isn't installed """
+    if numpy is None:
+        raise ImportError("FleetSnapshot needs numpy, install it with `pip install crowdstrike[snapshot]`")
+
+def parse_timestamps(values: list):
+    """ turns Crowdstrike's ISO8601 timestamps into a datetime64[s] array, missing values become NaT """
+    # numpy doesn't want the timezone, they're always UTC anyway
+    cleaned = [value[:-1] if value and value.endswith('Z') else (value or 'NaT') for value in values]
+    return numpy.array(cleaned, dtype='datetime64[us]').astype('datetime64[s]')
+
+def parse_version(version: str) -> tuple:
+    """ turns '6.30.14406.0' into (6, 30, 14406, 0) so versions compare properly """
+    parts = []
+    for part in (version or '').split('.'):
+        parts.append(int(part) if part.isdigit() else 0)
+    return tuple(parts)
+
+class FleetSnapshot:
+    """ a columnar snapshot of host details, see the module docstring """
+    def __init__(self, device_ids, codes: dict, categories: dict, timestamps: dict):
+        """ use from_pages() or from_client() rather than calling this directly """
+        require_numpy()
+        self.device_ids = device_ids
+        self.codes = codes
+        self.categories = categories
+        self.timestamps = timestamps
+
+    @classmethod
+    def from_pages(cls, pages):
+        """ builds a snapshot from an iterable of hosts_detail() responses (or lists of host records)
+
+        each page's converted to arrays as it arrives, so only one page of dicts is held at a time
+        """
+        require_numpy()
+        lookups = {column : {} for column in STRING_COLUMNS}
+        device_id_chunks = []
+        code_chunks = {column : [] for column in STRING_COLUMNS}
+        timestamp_chunks = {column : [] for column in TIMESTAMP_COLUMNS}
+
+        for page in pages:
+            records = (page.get('resources') or []) if isinstance(page, dict) else page
+            if not records:
+                continue
+            device_id_chunks.append(numpy.array([record.get('device_id') or '' for record in records], dtype=DEVICE_ID_DTYPE))
+            for column in STRING_COLUMNS:
+                lookup = lookups[column]
+                codes = [lookup.setdefault(record.get(column), len(lookup)) if record.get(column) is not None else -1 for record in records]
+                code_chunks[column].append(numpy.array(codes, dtype=numpy.int32))
+            for column in TIMESTAMP_COLUMNS:
+                timestamp_chunks[column].append(parse_timestamps([record.get(column) for record in records]))
+
+        def concatenate(chunks, dtype):
+            return numpy.concatenate(chunks) if chunks else numpy.array([], dtype=dtype)
+
+        snapshot = cls(
+            device_ids=concatenate(device_id_chunks, DEVICE_ID_DTYPE),
+            codes={column : concatenate(code_chunks[column], numpy.int32) for column in STRING_COLUMNS},
+            categories={column : list(lookups[column]) for column in STRING_COLUMNS},
+            timestamps={column : concatenate(timestamp_chunks[column], 'datetime64[s]') for column in TIMESTAMP_COLUMNS},
+        )
+        logger.debug(f"Built a snapshot of {len(snapshot)} hosts")
+        return snapshot
+
+    @classmethod
+    def from_client(cls, api, **kwargs):
+        """ builds a snapshot by streaming hosts from CrowdstrikeAPI.iter_hosts(), arguments are passed to it """
+        def chunks():
+            chunk = []
+            for record in api.iter_hosts(**kwargs):
+                chunk.append(record)
+                if len(chunk) >= SNAPSHOT_CHUNK_SIZE:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        return cls.from_pages(chunks())
+
+    def __len__(self):
+        return len(self.device_ids)
+
+    def column(self, name: str):
+        """ returns a column as an array, strings are decoded (to an object array) """
+        if name in self.timestamps:
+            return self.timestamps[name]
+        if name == 'device_id':
+            return self.device_ids.astype(str)
+        if name not in self.codes:
+            raise ValueError(f"Unknown column {name}, should be device_id or one of {','.join(STRING_COLUMNS + TIMESTAMP_COLUMNS)}")
+        lookup = numpy.array(self.categories[name] + [None], dtype=object)
+        # -1 (missing) indexes the None on the end
+        return lookup[self.codes[name]]
+
+    def equals(self, name: str, value):
+        """ returns a mask of the hosts where column name == value """
+        if name not in self.codes:
+            raise ValueError(f"{name} isn't a string column, should be one of {','.join(STRING_COLUMNS)}")
+        try:
+            code = self.categories[name].index(value)
+        except ValueError:
+            return numpy.zeros(len(self), dtype=bool)
+        return self.codes[name] == code
+
+    def isin(self, name: str, values: list):
+        """ returns a mask of the hosts where column name is one of values """
+        wanted = [code for code, category in enumerate(self.categories[name]) if category in set(values)]
+        return numpy.isin(self.codes[name], wanted)
+
+    def filter(self, mask) -> 'FleetSnapshot':
+        """ returns a new snapshot with just the hosts in mask, the categories are shared """
+        return FleetSnapshot(
+            device_ids=self.device_ids[mask],
+            codes={column : codes[mask] for column, codes in self.codes.items()},
+            categories=self.categories,
+            timestamps={column : values[mask] for column, values in self.timestamps.items()},
+        )
+
+    def count_by(self, name: str, mask=None) -> dict:
+        """ returns {value : number of hosts} for a string column, optionally only counting the hosts in mask """
+        codes = self.codes[name] if mask is None else self.codes[name][mask]
+        counts = numpy.bincount(codes[codes >= 0], minlength=len(self.categories[name]))
+        result = {category : int(count) for category, count in zip(self.categories[name], counts) if count}
+        missing = int(numpy.count_nonzero(codes < 0))
+        if missing:
+            result[None] = missing
+        return result
+
+    def stale(self, days: float = 30, now: datetime.datetime = None, column: str = 'last_seen'):
+        """ returns a mask of the hosts not seen in the last `days` days, hosts that have never been seen are included """
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+        # numpy wants a naive UTC datetime
+        if now.tzinfo is not None:
+            now = now.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        cutoff = numpy.datetime64(now, 's') - numpy.timedelta64(int(days * 86400), 's')
+        values = self.timestamps[column]
+        return numpy.isnat(values) | (values < cutoff)
+
+    def versions_behind(self, latest_version: str = None, column: str = 'agent_version'):
+        """ returns a mask of the hosts running an older version than latest_version (default: the newest in the snapshot)
+
+        versions are only parsed once per distinct value, then looked up by code
+        """
+        parsed = [parse_version(version) for version in self.categories[column]]
+        if not parsed:
+            return numpy.zeros(len(self), dtype=bool)
+        latest = parse_version(latest_version) if latest_version else max(parsed)
+        behind = numpy.array([version < latest for version in parsed] + [False], dtype=bool)
+        return behind[self.codes[column]]
+
+    def ids(self, mask=None) -> list:
+        """ returns the device IDs as a list of strings, optionally only the hosts in mask """
+        device_ids = self.device_ids if mask is None else self.device_ids[mask]
+        return [device_id.decode('ascii') for device_id in device_ids.tolist()]
+
+    def host_action(self, api, action_name: str, mask=None, **kwargs):
+        """ runs CrowdstrikeAPI.host_action_bulk() on the selected hosts, returns { id : None or the error message }
+
+        other arguments (batch_size, workers) are passed to host_action_bulk()
+        """
+        ids = self.ids(mask)
+        if not ids:
+            return {}
+        return api.host_action_bulk(actions={action_name : ids}, **kwargs).get(action_name)
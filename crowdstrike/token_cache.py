@@ -0,0 +1,88 @@
+""" on-disk OAuth token cache, so short-lived processes on the same host can share a token
+
+    crowdstrike = CrowdstrikeAPI(CLIENT_ID, CLIENT_SECRET, token_cache=TokenCache())
+
+Tokens are stored one file per client_id + base URL, readable only by the current user,
+written atomically and fetched under an advisory lock so only one process at a time
+goes to /oauth2/token.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import time
+
+from loguru import logger
+
+from .utilities import atomic_write
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+DEFAULT_TOKEN_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'crowdstrike')
+
+class TokenCache:
+    """ cross-process token cache, see the module docstring """
+    def __init__(self, path: str = DEFAULT_TOKEN_CACHE_DIR):
+        """ path is the directory to keep the tokens in, it'll be created (mode 0700) if it doesn't exist """
+        self.path = path
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+
+    def _filename(self, client_id: str, api_baseurl: str, suffix: str) -> str:
+        """ the client_id's hashed, so it's not sitting around in the filesystem """
+        key = hashlib.sha256(f"{client_id}|{api_baseurl}".encode('utf-8')).hexdigest()
+        return os.path.join(self.path, f"{key}{suffix}")
+
+    @contextlib.contextmanager
+    def lock(self, client_id: str, api_baseurl: str):
+        """ holds an exclusive advisory lock for this client_id + base URL """
+        lock_filename = self._filename(client_id, api_baseurl, '.lock')
+        file_descriptor = os.open(lock_filename, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(file_descriptor, fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                msvcrt.locking(file_descriptor, msvcrt.LK_LOCK, 1) # pylint: disable=no-member
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file_descriptor, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                msvcrt.locking(file_descriptor, msvcrt.LK_UNLCK, 1) # pylint: disable=no-member
+            os.close(file_descriptor)
+
+    def load(self, client_id: str, api_baseurl: str, min_ttl: float = 0) -> dict:
+        """ returns the cached token if there's one with at least min_ttl seconds left, otherwise None """
+        filename = self._filename(client_id, api_baseurl, '.json')
+        try:
+            with open(filename, 'r') as file_handle:
+                token = json.load(file_handle)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as error:
+            logger.debug(f"Ignoring unreadable token cache file {filename}: {error}")
+            return None
+        if not isinstance(token, dict) or 'access_token' not in token:
+            return None
+        if float(token.get('expires_at', 0)) - time.time() < min_ttl:
+            logger.debug("Cached token has expired")
+            return None
+        return token
+
+    def store(self, client_id: str, api_baseurl: str, token: dict):
+        """ writes the token to the cache """
+        filename = self._filename(client_id, api_baseurl, '.json')
+        atomic_write(filename, json.dumps(token), mode=0o600)
+
+    def delete(self, client_id: str, api_baseurl: str):
+        """ removes the cached token, ie when it's been revoked """
+        filename = self._filename(client_id, api_baseurl, '.json')
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(filename)
@@ -1,5 +1,92 @@
 """ utility functions for the crowdstrike API """
 
+import datetime
+import importlib
+import os
+import re
+import tempfile
+
+# 2021-01-01T00:00:00.123456789Z, the fraction and the offset are optional
+TIMESTAMP_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:?\d{2})?$')
+
+# which module each CrowdstrikeAPI endpoint lives in, they're imported the first time they're used
+ENDPOINT_MODULES = {
+    # sensor-related things
+    'get_ccid' : 'sensor_download',
+    'get_latest_sensor_id' : 'sensor_download',
+    'get_sensor_installer_details' : 'sensor_download',
+    'get_sensor_installer_ids' : 'sensor_download',
+    'download_sensor' : 'sensor_download',
+    # detects
+    'get_detects' : 'detects',
+    'get_detections' : 'detects',
+    'backfill_detects' : 'backfill',
+    'get_detects_aggregates' : 'detects',
+    'update_detection' : 'detects',
+    # event-streams
+    'get_event_streams' : 'event_streams',
+    # hosts
+    'hosts_query_devices' : 'hosts',
+    'host_action' : 'hosts',
+    'host_action_bulk' : 'hosts',
+    'hosts_hidden' : 'hosts',
+    'hosts_detail' : 'hosts',
+    'hosts_query_devices_scroll' : 'hosts',
+    'scroll_host_ids' : 'hosts',
+    'iter_hosts' : 'hosts',
+    # incidents
+    'incidents_behaviors_by_id' : 'incidents',
+    'incidents_get_crowdscores' : 'incidents',
+    'incidents_get_details' : 'incidents',
+    'incidents_perform_actions' : 'incidents',
+    'incidents_query' : 'incidents',
+    'incidents_query_behaviors' : 'incidents',
+    # hostgroups
+    'create_host_group' : 'hostgroup',
+    'search_host_groups' : 'hostgroup',
+    'get_host_groups' : 'hostgroup',
+    'update_host_group' : 'hostgroup',
+    'delete_host_groups' : 'hostgroup',
+    # intel
+    'get_intel_indicators' : 'intel',
+    # rtr
+    'create_rtr_session' : 'rtr',
+    'delete_rtr_session' : 'rtr',
+    'list_rtr_session_ids' : 'rtr',
+    'rtr_command_status' : 'rtr',
+    'rtr_execute_command' : 'rtr',
+    'rtr_command_status_wait' : 'rtr',
+    # rtr_admin
+    'search_rtr_scripts' : 'rtr_admin',
+    'get_rtr_scripts' : 'rtr_admin',
+    # pagination
+    'paginate' : 'pagination',
+}
+
+def lazy_import_endpoint(name: str):
+    """ imports the module an endpoint lives in and returns the endpoint function """
+    module = importlib.import_module(f".{ENDPOINT_MODULES[name]}", package=__package__)
+    return getattr(module, name)
+
+class LazyEndpoint:
+    """ stands in for an endpoint on CrowdstrikeAPI until it's first used
+
+    On first access it imports the endpoint's module (from ENDPOINT_MODULES) and replaces
+    itself on the class with the real function, so after that it's a normal method.
+    """
+    def __init__(self):
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        if name not in ENDPOINT_MODULES:
+            raise ValueError(f"{name} isn't listed in ENDPOINT_MODULES")
+        self.name = name
+
+    def __get__(self, instance, owner):
+        function = lazy_import_endpoint(self.name)
+        setattr(owner, self.name, function)
+        return function.__get__(instance, owner)
+
 def validate_kwargs(args_validation: dict, kwargs: dict, required: list = None):
     """ validates arguments pushed to the function
 
@@ -22,3 +109,49 @@ def validate_kwargs(args_validation: dict, kwargs: dict, required: list = None):
             if key not in kwargs:
                 raise ValueError(f"argument {key} needs to be set")
     return True
+
+def atomic_write(filename: str, contents: str, mode: int = 0o600):
+    """ writes contents to filename so readers only ever see the old or the new file, never a partial one
+
+    the file's created with the permissions in mode (default: only readable by the owner)
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    file_descriptor, temp_filename = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        os.chmod(temp_filename, mode)
+        with os.fdopen(file_descriptor, 'w') as file_handle:
+            file_handle.write(contents)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.unlink(temp_filename)
+        raise
+
+def parse_timestamp(value) -> datetime.datetime:
+    """ takes a datetime or an ISO8601 string (ie 2021-01-01T00:00:00.123Z) and returns a UTC datetime
+
+    this doesn't use fromisoformat(), before python 3.11 it can't handle the nanosecond fractions the API sometimes returns
+    """
+    if isinstance(value, str):
+        match = TIMESTAMP_PATTERN.match(value.strip())
+        if match is None:
+            raise ValueError(f"Can't parse timestamp '{value}'")
+        date_part, time_part, fraction, offset = match.groups()
+        value = datetime.datetime.strptime(f"{date_part}T{time_part}", '%Y-%m-%dT%H:%M:%S')
+        if fraction:
+            # anything past microseconds is dropped
+            value = value.replace(microsecond=int(fraction[:6].ljust(6, '0')))
+        if offset and offset != 'Z':
+            sign = -1 if offset[0] == '-' else 1
+            offset = offset[1:].replace(':', '')
+            delta = datetime.timedelta(hours=int(offset[:2]), minutes=int(offset[2:]))
+            value = value.replace(tzinfo=datetime.timezone(sign * delta))
+        else:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+    if not isinstance(value, datetime.datetime):
+        raise TypeError(f"Expected a datetime or an ISO8601 string, got {type(value)}")
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+""" tests the asyncio client """
+
+import asyncio
+import os
+import sys
+
+try:
+    from loguru import logger
+    from crowdstrike import AsyncCrowdstrikeAPI
+except ImportError as import_error:
+    sys.exit(f"Error importing required library: {import_error}")
+
+# grab config from the file or environment variable
+try:
+    from config import CLIENT_ID, CLIENT_SECRET
+except ImportError:
+    if os.environ.get('CLIENT_ID'):
+        logger.debug("Using Client ID from environment variable")
+        CLIENT_ID = os.environ.get('CLIENT_ID')
+    if os.environ.get('CLIENT_SECRET'):
+        logger.debug("Using Client Secret from environment variable")
+        CLIENT_SECRET = os.environ.get('CLIENT_SECRET')
+    if not CLIENT_ID and not CLIENT_SECRET:
+        sys.exit("you didn't set the config either via file or environment")
+
+logger.enable("crowdstrike")
+
+def test_async_hosts_detail():
+    """ queries some hosts then pulls their details one at a time, concurrently """
+    async def run_test():
+        async with AsyncCrowdstrikeAPI(CLIENT_ID, CLIENT_SECRET, max_concurrency=5) as crowdstrike:
+            hosts = await crowdstrike.hosts_query_devices(limit=5)
+            assert hosts.get('resources')
+            details = await asyncio.gather(*[crowdstrike.hosts_detail(ids=[host_id]) for host_id in hosts.get('resources')])
+            logger.debug(details)
+            assert len(details) == len(hosts.get('resources'))
+    asyncio.run(run_test())
+
+def test_async_validation():
+    """ the same argument validation applies """
+    async def run_test():
+        async with AsyncCrowdstrikeAPI(CLIENT_ID, CLIENT_SECRET) as crowdstrike:
+            try:
+                await crowdstrike.hosts_detail(ids="not a list")
+            except TypeError:
+                return
+            raise AssertionError("hosts_detail should have raised a TypeError")
+    asyncio.run(run_test())
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+""" tests the async generator wrappers, doesn't need API credentials """
+
+import asyncio
+import threading
+
+import pytest
+
+from crowdstrike import AsyncCrowdstrikeAPI, CrowdstrikeAPI
+
+def test_async_iterator_cancelled():
+    """ cancelling mid-page closes the generator once the page it's fetching comes back """
+    fetching = threading.Event()
+    release = threading.Event()
+    closed = threading.Event()
+
+    def pages(*args, **kwargs): # pylint: disable=unused-argument
+        try:
+            yield 'aid0'
+            fetching.set()
+            release.wait(5)
+            yield 'aid1'
+        finally:
+            closed.set()
+
+    api = CrowdstrikeAPI('client_id', 'client_secret', lazy_auth=True)
+    api.paginate = pages
+
+    async def consume():
+        async with AsyncCrowdstrikeAPI(api=api) as crowdstrike:
+            results = crowdstrike.paginate('hosts_query_devices')
+            assert await results.__anext__() == 'aid0'
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(results.__anext__(), 0.1)
+            assert fetching.is_set()
+            assert not closed.is_set()
+            release.set()
+            assert await asyncio.get_running_loop().run_in_executor(None, closed.wait, 5)
+
+    asyncio.run(consume())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+""" tests the sharded detection backfill, doesn't need API credentials """
+
+import datetime
+import re
+import threading
+
+import pytest
+
+from crowdstrike.backfill import backfill_detects, split_range
+
+START = datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc)
+# most of the detections are bunched up on the first day
+DETECTIONS = {f"ldt:{number}" : START + datetime.timedelta(minutes=number) for number in range(300)}
+DETECTIONS.update({f"ldt:late{number}" : START + datetime.timedelta(days=5 + number) for number in range(20)})
+
+class BackfillAPI:
+    """ answers first_behavior range queries from DETECTIONS """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = []
+        # (limit, total) for each request
+        self.pages = []
+
+    def get_detects(self, **kwargs):
+        """ pretends to be get_detects() """
+        start, end = re.findall(r"'([^']+)'", kwargs.get('filter'))
+        with self.lock:
+            self.queries.append((start, end))
+        matching = sorted(detection_id for detection_id, first_behavior in DETECTIONS.items()
+                          if start <= first_behavior.strftime('%Y-%m-%dT%H:%M:%SZ') < end)
+        with self.lock:
+            self.pages.append((kwargs.get('limit'), len(matching)))
+        return {'resources' : matching[:kwargs.get('limit')], 'meta' : {'pagination' : {'total' : len(matching)}}}
+
+def test_split_range():
+    """ shards cover the whole range with no gaps """
+    shards = split_range(START, START + datetime.timedelta(days=1), 3)
+    assert shards[0][0] == START
+    assert shards[-1][1] == START + datetime.timedelta(days=1)
+    assert all(left[1] == right[0] for left, right in zip(shards, shards[1:]))
+
+def test_backfill_splits_big_shards():
+    """ every ID comes back once, and the busy shard got split """
+    api = BackfillAPI()
+    ids = list(backfill_detects(api, start='2021-01-01T00:00:00Z', end='2021-02-01T00:00:00Z', shards=4, max_shard_size=50))
+    assert sorted(ids) == sorted(DETECTIONS)
+    assert len(api.queries) > 4
+    # shards that were too big were found with limit=1 requests, not by fetching a full page
+    assert not [total for limit, total in api.pages if limit == 50 and total > 50]
+
+def test_backfill_timestamps():
+    """ nanosecond fractions and offsets are fine on every python version """
+    api = BackfillAPI()
+    ids = list(backfill_detects(api, start='2020-12-31T23:00:00.123456789Z', end='2021-01-01T11:00:00+10:00', shards=1))
+    assert sorted(ids) == sorted(detection_id for detection_id, first_behavior in DETECTIONS.items() if first_behavior < START + datetime.timedelta(hours=1))
+
+def test_backfill_arguments():
+    """ bad arguments are caught before anything's requested """
+    with pytest.raises(ValueError):
+        list(backfill_detects(BackfillAPI(), start='2021-02-01T00:00:00Z', end='2021-01-01T00:00:00Z'))
+    with pytest.raises(ValueError):
+        list(backfill_detects(BackfillAPI(), start='2021-01-01T00:00:00Z', nope=1))
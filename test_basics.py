@@ -36,3 +36,10 @@ def test_revoke_token(crowdstrike_client=crowdstrike):
 
     response = crowdstrike_client.revoke_token()
     logger.debug(response)
+
+def test_lazy_auth():
+    """ with lazy_auth the token's only fetched on the first request """
+    lazy_client = CrowdstrikeAPI(CLIENT_ID, CLIENT_SECRET, lazy_auth=True)
+    assert lazy_client.token is None
+    assert lazy_client.get_ccid()
+    assert lazy_client.token is not None
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+""" tests the entity ID batching, doesn't need API credentials """
+
+from crowdstrike.batching import batched_entity_request, merge_entity_responses
+from crowdstrike.hosts import host_action_bulk
+
+def test_batches_and_merges():
+    """ ids get split into batches and the results come back in order """
+    requested = []
+
+    def fetch(ids):
+        requested.append(len(ids))
+        return {
+            'meta' : {'query_time' : 0.5, 'trace_id' : f"trace-{ids[0]}"},
+            'resources' : [{'id' : host_id} for host_id in ids],
+            'errors' : [],
+        }
+    response = batched_entity_request(fetch, [str(number) for number in range(250)], batch_size=100)
+    assert sorted(requested) == [50, 100, 100]
+    assert [resource.get('id') for resource in response.get('resources')] == [str(number) for number in range(250)]
+    assert response.get('meta').get('query_time') == 1.5
+    assert len(response.get('meta').get('trace_ids')) == 3
+
+def test_single_batch_untouched():
+    """ a list that fits in one batch is passed straight through """
+    assert batched_entity_request(lambda ids: {'resources' : ids}, ['a', 'b'], batch_size=100) == {'resources' : ['a', 'b']}
+
+def test_merge_errors():
+    """ errors from every batch are kept """
+    merged = merge_entity_responses([
+        {'resources' : ['a'], 'errors' : [{'code' : 404, 'message' : 'not found'}]},
+        {'resources' : ['b'], 'errors' : None},
+    ])
+    assert merged.get('resources') == ['a', 'b']
+    assert merged.get('errors') == [{'code' : 404, 'message' : 'not found'}]
+
+class HostActionAPI: # pylint: disable=too-few-public-methods
+    """ records host_action() calls, 'bad' comes back with an error and 'broken' makes the call raise """
+    def __init__(self):
+        self.calls = []
+
+    def host_action(self, **kwargs):
+        """ pretends to run the action """
+        self.calls.append((kwargs.get('action_name'), kwargs.get('ids')))
+        if 'broken' in kwargs.get('ids'):
+            raise RuntimeError("connection reset")
+        return {
+            'resources' : [{'id' : host_id} for host_id in kwargs.get('ids') if host_id != 'bad'],
+            'errors' : [{'code' : 404, 'message' : 'Device bad not found'}] if 'bad' in kwargs.get('ids') else [],
+        }
+
+def test_host_action_bulk():
+    """ chunks, containment first, and a result for every host """
+    api = HostActionAPI()
+    hide = [f"hide{number}" for number in range(5)] + ['bad']
+    result = host_action_bulk(api, actions={'hide_host' : hide, 'contain' : ['c1', 'c2', 'c1']}, batch_size=2, workers=1)
+    assert api.calls[0] == ('contain', ['c1', 'c2'])
+    assert [len(ids) for _, ids in api.calls] == [2, 2, 2, 2]
+    assert result['contain'] == {'c1' : None, 'c2' : None}
+    assert result['hide_host']['hide0'] is None
+    assert result['hide_host']['bad'] == 'Device bad not found'
+
+def test_host_action_bulk_partial_failure():
+    """ a chunk that raises only fails its own hosts """
+    result = host_action_bulk(HostActionAPI(), actions={'hide_host' : ['a', 'broken', 'b']}, batch_size=2)
+    assert result['hide_host'] == {'a' : 'connection reset', 'broken' : 'connection reset', 'b' : None}
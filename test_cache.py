@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+""" tests the response cache, doesn't need API credentials """
+
+import time
+
+from crowdstrike import CrowdstrikeAPI
+from crowdstrike.cache import LRUCache, ResponseCache, extract_ids
+
+class CachedResponse: # pylint: disable=too-few-public-methods
+    """ just enough of a requests.Response for the cache """
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+
+def test_lru_eviction():
+    """ the least recently used entry goes first """
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2, ttl=60)
+    assert cache.get('a') == (1, False)
+    cache.set('c', 3, ttl=60)
+    assert cache.get('b') is None
+    assert len(cache) == 2
+
+def test_stale_while_revalidate():
+    """ an expired entry's served stale while it's refreshed """
+    cache = ResponseCache(ttls={'/devices/entities/devices/v1' : 0.01}, stale_while_revalidate=60)
+    original = CachedResponse()
+    fresh = CachedResponse()
+    cache.store('get', '/devices/entities/devices/v1', {'ids' : ['abc']}, original)
+    time.sleep(0.02)
+    assert cache.get('get', '/devices/entities/devices/v1', {'ids' : ['abc']}, revalidate=lambda: fresh) is original
+    time.sleep(0.1)
+    assert cache.get('get', '/devices/entities/devices/v1', {'ids' : ['abc']}, revalidate=lambda: fresh) is fresh
+
+def test_invalidation():
+    """ host_action drops the cached details for the hosts it touched, and only those """
+    cache = ResponseCache()
+    cache.store('get', '/devices/entities/devices/v1', {'ids' : ['abc', 'def']}, CachedResponse())
+    cache.store('get', '/devices/entities/devices/v1', {'ids' : ['ghi']}, CachedResponse())
+    cache.store('get', '/devices/entities/devices/v1', {'ids' : ['jkl']}, CachedResponse(status_code=404))
+    assert cache.invalidate('post', '/devices/entities/devices-actions/v2', {'action_name' : 'contain', 'ids' : ['def']}) == 1
+    assert cache.get('get', '/devices/entities/devices/v1', {'ids' : ['ghi']}, revalidate=None) is not None
+    assert cache.stats().get('size') == 1
+
+def test_invalidated_while_fetching():
+    """ a response that was in flight when the cache was invalidated isn't stored """
+    cache = ResponseCache()
+    crowdstrike = CrowdstrikeAPI('client_id', 'client_secret', lazy_auth=True, response_cache=cache)
+
+    def send(**kwargs): # pylint: disable=unused-argument
+        cache.invalidate('post', '/devices/entities/devices-actions/v2', {'action_name' : 'contain', 'ids' : ['abc']})
+        return CachedResponse()
+    crowdstrike._send = send # pylint: disable=protected-access
+    crowdstrike.request('/devices/entities/devices/v1', 'get', {'ids' : ['abc']})
+    assert cache.stats().get('size') == 0
+
+    crowdstrike._send = lambda **kwargs: CachedResponse() # pylint: disable=protected-access
+    crowdstrike.request('/devices/entities/devices/v1', 'get', {'ids' : ['abc']})
+    assert cache.stats().get('size') == 1
+
+def test_extract_ids():
+    """ ids come from ids, id and resources """
+    assert extract_ids({'ids' : ['a', 'b']}) == {'a', 'b'}
+    assert extract_ids({'ids' : 'a'}) == {'a'}
+    assert extract_ids({'resources' : [{'id' : 'a', 'name' : 'test'}]}) == {'a'}
+    assert extract_ids(None) == set()
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+
+""" tests the connection pool settings, doesn't need API credentials """
+
+from crowdstrike import CrowdstrikeAPI
+
+def test_connection_pool():
+    """ the pool settings are applied to the adapter on the session, including when they're changed """
+    crowdstrike = CrowdstrikeAPI('client_id', 'client_secret', lazy_auth=True, pool_connections=2, pool_maxsize=5)
+    adapter = crowdstrike.oauth.get_adapter(crowdstrike.api_baseurl)
+    # pylint: disable=protected-access
+    assert (adapter._pool_connections, adapter._pool_maxsize, adapter._pool_block) == (2, 5, False)
+    assert 'Connection' not in crowdstrike.oauth.headers
+
+    crowdstrike.configure_connection_pool(pool_connections=3, pool_maxsize=20, pool_block=True, keep_alive=False)
+    adapter = crowdstrike.oauth.get_adapter(crowdstrike.api_baseurl)
+    assert (adapter._pool_connections, adapter._pool_maxsize, adapter._pool_block) == (3, 20, True)
+    assert adapter.poolmanager.connection_pool_kw.get('maxsize') == 20
+    assert crowdstrike.oauth.headers.get('Connection') == 'close'
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+""" tests the incremental detection sync, doesn't need API credentials """
+
+import os
+import re
+import tempfile
+
+from crowdstrike.detection_sync import DetectionSync
+from crowdstrike.utilities import parse_timestamp
+
+DETECTIONS = [
+    {'detection_id' : 'ldt:1', 'date_updated' : '2021-01-01T00:00:00Z', 'status' : 'new'},
+    {'detection_id' : 'ldt:2', 'date_updated' : '2021-01-02T00:00:00Z', 'status' : 'new'},
+    {'detection_id' : 'ldt:3', 'date_updated' : '2021-01-02T00:00:00Z', 'status' : 'new'},
+]
+
+class DetectsAPI:
+    """ answers date_updated:>= and <= queries from a list of detections, a page at a time in detection_id order """
+    def __init__(self, detections):
+        self.detections = {detection['detection_id'] : detection for detection in detections}
+        self.filters = []
+        self.limits = []
+
+    def matching(self, query_filter: str) -> list:
+        """ the IDs of the detections that match the filter """
+        bounds = dict(re.findall(r"date_updated:([<>]=)'([^']+)'", query_filter or ''))
+        matching = []
+        for detection in self.detections.values():
+            updated = parse_timestamp(detection['date_updated'])
+            if '>=' in bounds and updated < parse_timestamp(bounds['>=']):
+                continue
+            if '<=' in bounds and updated > parse_timestamp(bounds['<=']):
+                continue
+            matching.append(detection['detection_id'])
+        return sorted(matching)
+
+    def get_detects(self, **kwargs):
+        """ pretends to be get_detects() """
+        self.filters.append(kwargs.get('filter'))
+        self.limits.append(kwargs.get('limit'))
+        ids = self.matching(kwargs.get('filter'))
+        offset = kwargs.get('offset', 0)
+        page = {'resources' : ids[offset:offset + kwargs.get('limit')], 'meta' : {'pagination' : {'offset' : offset, 'total' : len(ids)}}}
+        self.query_answered()
+        return page
+
+    def paginate(self, endpoint, **kwargs):
+        """ pretends to be paginate('get_detects') """
+        assert endpoint == 'get_detects'
+        self.filters.append(kwargs.get('filter'))
+        return iter(self.matching(kwargs.get('filter')))
+
+    def query_answered(self):
+        """ subclasses change the detections once a query's been answered """
+
+    def get_detections(self, ids, **kwargs): # pylint: disable=unused-argument
+        """ returns the detections """
+        return {'resources' : [self.detections[detection_id] for detection_id in ids]}
+
+def test_detection_sync():
+    """ each version of a detection is yielded once, across restarts """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'detections.json')
+        api = DetectsAPI(DETECTIONS)
+        assert [detection['detection_id'] for detection in DetectionSync(path).poll(api, batch_size=2)] == ['ldt:1', 'ldt:2', 'ldt:3']
+        assert not list(DetectionSync(path).poll(api))
+        assert api.filters[-1].startswith("date_updated:>='2021-01-02T00:00:00Z'+date_updated:<='")
+
+        api.detections['ldt:1'] = dict(DETECTIONS[0], status='false_positive', date_updated='2021-01-03T00:00:00Z')
+        api.detections['ldt:4'] = {'detection_id' : 'ldt:4', 'date_updated' : '2021-01-02T00:00:00Z', 'status' : 'new'}
+        updated = list(DetectionSync(path).poll(api))
+        assert [(detection['detection_id'], detection['status']) for detection in updated] == [('ldt:4', 'new'), ('ldt:1', 'false_positive')]
+
+def test_detection_sync_stop_early():
+    """ stopping part way through saves what's been consumed """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'detections.json')
+        api = DetectsAPI(DETECTIONS)
+        poll = DetectionSync(path).poll(api)
+        assert next(poll)['detection_id'] == 'ldt:1'
+        assert next(poll)['detection_id'] == 'ldt:2'
+        poll.close()
+        assert [detection['detection_id'] for detection in DetectionSync(path).poll(api)] == ['ldt:2', 'ldt:3']
+
+class UpdatingDetectsAPI(DetectsAPI):
+    """ updates detections after the first query's been answered, before it's hydrated """
+    def __init__(self, detections, updates):
+        super().__init__(detections)
+        self.updates = updates
+
+    def query_answered(self):
+        for updated in self.updates:
+            self.detections[updated['detection_id']] = updated
+        self.updates = []
+
+def test_detection_sync_updated_while_polling():
+    """ a detection that's updated between the query and get_detections() doesn't hide the rest of the poll """
+    api = UpdatingDetectsAPI(DETECTIONS, [
+        dict(DETECTIONS[0], status='in_progress', date_updated='2021-01-05T00:00:00.5Z'),
+        # updated after the poll started, so it's left for the next one
+        dict(DETECTIONS[2], status='closed', date_updated='2999-01-01T00:00:00Z'),
+    ])
+    sync = DetectionSync()
+    polled = [(detection['detection_id'], detection['status']) for detection in sync.poll(api, batch_size=1)]
+    assert polled == [('ldt:1', 'in_progress'), ('ldt:2', 'new')]
+    assert sync.watermark == '2021-01-05T00:00:00.5Z'
+    assert not list(sync.poll(api))
+
+def test_detection_sync_fractional_seconds():
+    """ timestamps are compared as times, not strings """
+    api = DetectsAPI([
+        {'detection_id' : 'ldt:1', 'date_updated' : '2021-01-01T00:00:00.123Z', 'status' : 'new'},
+        {'detection_id' : 'ldt:2', 'date_updated' : '2021-01-01T00:00:01Z', 'status' : 'new'},
+    ])
+    sync = DetectionSync()
+    assert [detection['detection_id'] for detection in sync.poll(api)] == ['ldt:1', 'ldt:2']
+    assert sync.watermark == '2021-01-01T00:00:01Z'
+    api.detections['ldt:3'] = {'detection_id' : 'ldt:3', 'date_updated' : '2021-01-01T00:00:01.000001Z', 'status' : 'new'}
+    assert [detection['detection_id'] for detection in sync.poll(api)] == ['ldt:3']
+
+class HydrateUpdatingDetectsAPI(DetectsAPI):
+    """ updates detections after the first batch has been hydrated """
+    def __init__(self, detections, updates):
+        super().__init__(detections)
+        self.updates = updates
+
+    def get_detections(self, ids, **kwargs):
+        response = super().get_detections(ids, **kwargs)
+        for updated in self.updates:
+            self.detections[updated['detection_id']] = updated
+        self.updates = []
+        return response
+
+def test_detection_sync_updated_between_pages():
+    """ a detection updated after its page was read doesn't push another one out of the next page """
+    detections = [
+        {'detection_id' : f"ldt:0{number}", 'date_updated' : f"2021-01-01T00:00:0{number}Z", 'status' : 'new'}
+        for number in range(6)
+    ]
+    api = HydrateUpdatingDetectsAPI(detections, [dict(detections[0], status='closed', date_updated='2021-01-02T00:00:00Z')])
+    sync = DetectionSync()
+    polled = [(detection['detection_id'], detection['status']) for detection in sync.poll(api, batch_size=3, page_size=3)]
+    assert sorted(polled) == sorted([(detection['detection_id'], 'new') for detection in detections] + [('ldt:00', 'closed')])
+    assert sync.watermark == '2021-01-02T00:00:00Z'
+    # every query's one page from offset 0
+    assert set(api.limits) <= {1, 3}
+    assert not list(sync.poll(api, page_size=3))
+
+def test_detection_sync_busy_second():
+    """ a second with more detections than fit in a page is paged through """
+    detections = [{'detection_id' : f"ldt:{number}", 'date_updated' : '2021-01-01T00:00:00Z', 'status' : 'new'} for number in range(5)]
+    api = DetectsAPI(detections)
+    sync = DetectionSync()
+    assert sorted(detection['detection_id'] for detection in sync.poll(api, since='2021-01-01T00:00:00Z', page_size=2)) == sorted(api.detections)
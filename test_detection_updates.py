@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+""" tests the detection update batcher, doesn't need API credentials """
+
+import threading
+
+import pytest
+
+from crowdstrike.detection_updates import DetectionUpdateBatcher
+
+class UpdateAPI:
+    """ records update_detection() calls, 'ldt:bad' comes back with an error """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def update_detection(self, **kwargs):
+        """ pretends to update the detections """
+        with self.lock:
+            self.calls.append(kwargs)
+        errors = [{'code' : 404, 'message' : 'Detection ldt:bad not found'}] if 'ldt:bad' in kwargs.get('ids') else []
+        return {'meta' : {}, 'resources' : [], 'errors' : errors}
+
+def test_coalesces_updates():
+    """ identical payloads share a request, and each detection gets its own outcome """
+    api = UpdateAPI()
+    with DetectionUpdateBatcher(api, batch_size=3, flush_interval=60) as batcher:
+        closed = [batcher.update(f"ldt:{number}", status='false_positive', show_in_ui=False) for number in range(4)]
+        assigned = batcher.update('ldt:bad', assigned_to_uuid='user1')
+        assert batcher.update('ldt:0', status='false_positive', show_in_ui=False) is closed[0]
+    payloads = sorted((len(call['ids']), call.get('status', call.get('assigned_to_uuid'))) for call in api.calls)
+    assert payloads == [(1, 'false_positive'), (1, 'user1'), (3, 'false_positive')]
+    assert all(future.result()['errors'] == [] for future in closed)
+    with pytest.raises(RuntimeError):
+        assigned.result()
+
+def test_flushes_on_time():
+    """ a part-full group goes out after flush_interval """
+    api = UpdateAPI()
+    batcher = DetectionUpdateBatcher(api, flush_interval=0.1)
+    future = batcher.update('ldt:1', status='in_progress')
+    future.result(timeout=5)
+    assert api.calls == [{'ids' : ['ldt:1'], 'status' : 'in_progress'}]
+    batcher.close()
+
+def test_keeps_update_order():
+    """ a different update to a queued detection sends the first one before it's queued """
+    api = UpdateAPI()
+    with DetectionUpdateBatcher(api, flush_interval=60) as batcher:
+        batcher.update('ldt:1', status='in_progress')
+        batcher.update('ldt:1', status='true_positive')
+    assert [call['status'] for call in api.calls] == ['in_progress', 'true_positive']
+
+def test_bad_arguments():
+    """ typos are caught straight away """
+    with DetectionUpdateBatcher(UpdateAPI()) as batcher:
+        with pytest.raises(ValueError):
+            batcher.update('ldt:1', status='closed')
+        with pytest.raises(ValueError):
+            batcher.update('ldt:1', state='new')
@@ -52,6 +52,24 @@ def test_get_detections():
     assert response.get('resources')
 
 
+def test_paginate_detects_prefetch():
+    """ prefetching pages gives the same results, in the same order """
+    crowdstrike = CrowdstrikeAPI(CLIENT_ID, CLIENT_SECRET)
+
+    sequential = list(crowdstrike.paginate('get_detects', limit=100, sort='first_behavior|asc'))
+    prefetched = list(crowdstrike.paginate('get_detects', limit=100, sort='first_behavior|asc', prefetch=4))
+    assert sequential == prefetched
+
+def test_get_detects_aggregates():
+    """ counts detections by status server-side """
+    from crowdstrike.detects import aggregate_buckets, terms_aggregate # pylint: disable=import-outside-toplevel
+    crowdstrike = CrowdstrikeAPI(CLIENT_ID, CLIENT_SECRET)
+
+    response = crowdstrike.get_detects_aggregates(aggregates=[terms_aggregate('status')])
+    logger.debug(response)
+    assert not response.get('errors')
+    assert aggregate_buckets(response, 'status')
+
 
 if __name__ == '__main__':
     test_get_detections()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+""" tests the detects aggregate query builders, doesn't need API credentials """
+
+import pytest
+
+from crowdstrike.detects import aggregate_buckets, aggregate_query, date_histogram_aggregate, facet_aggregates, terms_aggregate
+
+def test_builders():
+    """ the builders fill in the type and name """
+    assert terms_aggregate('device.hostname', size=5) == {'type' : 'terms', 'field' : 'device.hostname', 'name' : 'device.hostname', 'size' : 5}
+    per_day = date_histogram_aggregate(name='per_day', sub_aggregates=[terms_aggregate('max_severity_displayname')])
+    assert per_day.get('interval') == 'day'
+    assert per_day.get('field') == 'first_behavior'
+    assert per_day.get('sub_aggregates')[0].get('type') == 'terms'
+    assert [facet.get('name') for facet in facet_aggregates(['status', 'behaviors.tactic'])] == ['status', 'behaviors.tactic']
+
+def test_builder_validation():
+    """ typos and bad types are caught before the request """
+    with pytest.raises(ValueError):
+        aggregate_query('histogram', 'first_behavior')
+    with pytest.raises(ValueError):
+        date_histogram_aggregate(interval='fortnight')
+    with pytest.raises(ValueError):
+        terms_aggregate('status', sizes=5)
+    with pytest.raises(TypeError):
+        terms_aggregate('status', size='5')
+
+def test_aggregate_buckets():
+    """ pulls the counts out of a response """
+    response = {'resources' : [{'name' : 'status', 'buckets' : [{'label' : 'new', 'count' : 3}, {'label' : 'closed', 'count' : 1}]}]}
+    assert aggregate_buckets(response, 'status') == {'new' : 3, 'closed' : 1}
+    with pytest.raises(ValueError):
+        aggregate_buckets(response, 'tactic')
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+""" tests the detection/host enrichment, doesn't need API credentials """
+
+from crowdstrike.enrichment import DetectionEnricher, HostCache
+
+HOSTS = {
+    'aid1' : {'device_id' : 'aid1', 'hostname' : 'WORKSTATION01', 'platform_name' : 'Windows'},
+    'aid2' : {'device_id' : 'aid2', 'hostname' : 'laptop02', 'platform_name' : 'Mac'},
+}
+DETECTIONS = {
+    f"ldt:{number}" : {'detection_id' : f"ldt:{number}", 'device' : {'device_id' : ['aid1', 'aid2', 'gone'][number % 3]}}
+    for number in range(9)
+}
+
+class EnrichmentAPI:
+    """ returns canned detections and hosts, and records the host lookups """
+    def __init__(self):
+        self.host_lookups = []
+
+    def get_detections(self, ids):
+        """ pretends to be get_detections() """
+        return {'resources' : [DETECTIONS[detection_id] for detection_id in ids]}
+
+    def hosts_detail(self, **kwargs):
+        """ pretends to be hosts_detail(), unknown hosts come back as errors """
+        self.host_lookups.append(sorted(kwargs.get('ids')))
+        found = [HOSTS[device_id] for device_id in kwargs.get('ids') if device_id in HOSTS]
+        errors = [{'code' : 404, 'message' : f"{device_id} not found"} for device_id in kwargs.get('ids') if device_id not in HOSTS]
+        return {'resources' : found, 'errors' : errors}
+
+def test_enrich_ids():
+    """ each window looks each host up once, and the cache covers the next window """
+    api = EnrichmentAPI()
+    enricher = DetectionEnricher(api, window=6)
+    enriched = list(enricher.enrich_ids(sorted(DETECTIONS), batch_size=4))
+    assert [detection['detection_id'] for detection in enriched] == sorted(DETECTIONS)
+    assert enriched[0]['host']['hostname'] == 'WORKSTATION01'
+    assert enriched[2]['host'] is None
+    assert api.host_lookups == [['aid1', 'aid2', 'gone']]
+    assert enricher.host_cache.stats().get('hits') == 3
+
+def test_shared_cache():
+    """ enrichers sharing a cache don't look the same hosts up again """
+    api = EnrichmentAPI()
+    host_cache = HostCache(api, fields=['hostname'])
+    list(DetectionEnricher(api, host_cache=host_cache).enrich(DETECTIONS.values()))
+    list(DetectionEnricher(api, host_cache=host_cache).enrich(DETECTIONS.values()))
+    assert len(api.host_lookups) == 1
+    assert host_cache.get('aid2') == HOSTS['aid2']
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+""" tests the hidden host sync, doesn't need API credentials """
+
+import os
+import tempfile
+
+from crowdstrike.hidden_hosts import HiddenHostSync
+
+class HiddenAPI:
+    """ keeps a hidden set, 'stuck' can't be unhidden """
+    def __init__(self, hidden):
+        self.hidden = set(hidden)
+        self.paginated = 0
+        self.actions = []
+
+    def paginate(self, endpoint, **kwargs): # pylint: disable=unused-argument
+        """ returns the hidden hosts """
+        assert endpoint == 'hosts_hidden'
+        self.paginated += 1
+        return iter(sorted(self.hidden))
+
+    def host_action_bulk(self, **kwargs):
+        """ applies the changes """
+        self.actions.append(kwargs.get('actions'))
+        results = {}
+        for action_name, ids in kwargs.get('actions').items():
+            results[action_name] = {}
+            for host_id in ids:
+                if host_id == 'stuck':
+                    results[action_name][host_id] = 'Device not found'
+                elif action_name == 'hide_host':
+                    self.hidden.add(host_id)
+                    results[action_name][host_id] = None
+                else:
+                    self.hidden.discard(host_id)
+                    results[action_name][host_id] = None
+        return results
+
+def test_hidden_sync():
+    """ only the delta is sent, and the local copy's reused on the next run """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'hidden.json')
+        api = HiddenAPI(['a', 'b', 'stuck'])
+        results = HiddenHostSync(path).sync(api, desired=['b', 'c'])
+        assert api.actions == [{'hide_host' : ['c'], 'unhide_host' : ['a', 'stuck']}]
+        assert results['unhide_host'] == {'a' : None, 'stuck' : 'Device not found'}
+
+        # a new process picks up the saved set, and doesn't pull it again
+        hidden = HiddenHostSync(path)
+        assert sorted(hidden.hidden) == ['b', 'c', 'stuck']
+        assert hidden.sync(api, desired=['b', 'c', 'stuck']) == {}
+        assert api.paginated == 1
+        assert len(api.actions) == 1
+
+def test_hidden_dry_run():
+    """ dry_run doesn't change anything """
+    api = HiddenAPI(['a'])
+    hidden = HiddenHostSync()
+    assert hidden.sync(api, desired=['b'], dry_run=True) == {'hide_host' : ['b'], 'unhide_host' : ['a']}
+    assert not api.actions
+    assert 'a' in hidden
+
+def test_hidden_stale():
+    """ a local copy older than max_age is pulled again, so changes made elsewhere are picked up """
+    api = HiddenAPI(['a'])
+    hidden = HiddenHostSync(max_age=3600)
+    hidden.sync(api, desired=['a'])
+    assert api.paginated == 1
+    assert not hidden.is_stale()
+
+    # unhidden in the console, the local copy doesn't know
+    api.hidden.discard('a')
+    hidden.synced_at = '2021-01-01T00:00:00Z'
+    assert hidden.is_stale()
+    assert hidden.sync(api, desired=['a']) == {'hide_host' : {'a' : None}}
+    assert api.paginated == 2
+
+    hidden.max_age = None
+    hidden.synced_at = '2021-01-01T00:00:00Z'
+    assert not hidden.is_stale()
@@ -58,3 +58,28 @@ def test_hosts_hidden(crowdstrike_client=crowdstrike):
     test = crowdstrike_client.hosts_hidden(limit=10)
     logger.debug(json.dumps(test))
     assert test is not None
+
+def test_paginate_hosts(crowdstrike_client=crowdstrike):
+    """ test paginate() walks more than one page """
+    logger.info("testing paginate('hosts_query_devices')")
+    host_ids = list(crowdstrike_client.paginate('hosts_query_devices', limit=5))
+    logger.debug(f"Found {len(host_ids)} hosts")
+    assert len(host_ids) == len(set(host_ids))
+    total = crowdstrike_client.hosts_query_devices(limit=1).get('meta', {}).get('pagination', {}).get('total')
+    assert len(host_ids) == total
+
+def test_scroll_host_ids(crowdstrike_client=crowdstrike):
+    """ test scroll_host_ids() finds every host, once """
+    logger.info("testing scroll_host_ids()")
+    host_ids = list(crowdstrike_client.scroll_host_ids(limit=100))
+    assert len(host_ids) == len(set(host_ids))
+    total = crowdstrike_client.hosts_query_devices(limit=1).get('meta', {}).get('pagination', {}).get('total')
+    assert len(host_ids) == total
+
+def test_iter_hosts(crowdstrike_client=crowdstrike):
+    """ test iter_hosts() hydrates every host """
+    logger.info("testing iter_hosts()")
+    hosts = list(crowdstrike_client.iter_hosts(batch_size=10, workers=2))
+    assert hosts
+    assert all('device_id' in host for host in hosts)
+    assert len(hosts) == len(list(crowdstrike_client.scroll_host_ids()))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+""" tests the local host inventory, doesn't need API credentials """
+
+import os
+import tempfile
+
+from crowdstrike.inventory import HostInventory
+
+HOSTS = [
+    {
+        'device_id' : 'aid1',
+        'hostname' : 'WORKSTATION01',
+        'local_ip' : '10.0.0.1',
+        'external_ip' : '203.0.113.1',
+        'mac_address' : '00-50-56-a1-b2-c3',
+        'platform_name' : 'Windows',
+        'agent_version' : '6.30.14406.0',
+        'last_seen' : '2021-01-01T00:00:00Z',
+        'modified_timestamp' : '2021-01-01T00:00:00Z',
+    },
+    {
+        'device_id' : 'aid2',
+        'hostname' : 'laptop02',
+        'local_ip' : '10.0.0.2',
+        'external_ip' : '203.0.113.1',
+        'mac_address' : '00-50-56-a1-b2-c4',
+        'platform_name' : 'Mac',
+        'agent_version' : '6.29.14203.0',
+        'last_seen' : '2021-02-01T00:00:00Z',
+        'modified_timestamp' : '2021-02-01T00:00:00Z',
+    },
+]
+
+class InventoryAPI: # pylint: disable=too-few-public-methods
+    """ hands back canned hosts from iter_hosts() and remembers the filter """
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self.filters = []
+
+    def iter_hosts(self, **kwargs):
+        """ pretends to be CrowdstrikeAPI.iter_hosts() """
+        self.filters.append(kwargs.get('filter'))
+        yield from self.hosts
+
+    def scroll_host_ids(self, **kwargs): # pylint: disable=unused-argument
+        """ pretends to be CrowdstrikeAPI.scroll_host_ids() """
+        yield from [host.get('device_id') for host in self.hosts]
+
+def test_lookups():
+    """ hostname, IP and MAC lookups """
+    with HostInventory() as inventory:
+        assert inventory.refresh(InventoryAPI(HOSTS)) == 2
+        assert inventory.by_hostname('workstation01')[0].get('device_id') == 'aid1'
+        assert inventory.by_ip('10.0.0.2')[0].get('device_id') == 'aid2'
+        assert len(inventory.by_ip('203.0.113.1')) == 2
+        assert inventory.by_mac('00:50:56:A1:B2:C3')[0].get('device_id') == 'aid1'
+        assert [host.get('device_id') for host in inventory.last_seen_before('2021-01-15T00:00:00Z')] == ['aid1']
+
+def test_incremental_refresh():
+    """ the second refresh only asks for hosts modified since the first, and it survives a reopen """
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, 'hosts.db')
+        with HostInventory(path) as inventory:
+            inventory.refresh(InventoryAPI(HOSTS))
+        api = InventoryAPI([dict(HOSTS[0], hostname='WORKSTATION99', modified_timestamp='2021-03-01T00:00:00Z')])
+        with HostInventory(path) as inventory:
+            inventory.refresh(api)
+            assert api.filters == ["modified_timestamp:>='2021-02-01T00:00:00Z'"]
+            assert inventory.get('aid1').get('hostname') == 'WORKSTATION99'
+            assert inventory.watermark == '2021-03-01T00:00:00Z'
+            assert len(inventory) == 2
+
+def test_watermark_fractional_seconds():
+    """ the watermark's the newest modified_timestamp as a time, not as a string """
+    with HostInventory() as inventory:
+        inventory.refresh(InventoryAPI([
+            dict(HOSTS[0], modified_timestamp='2021-03-01T00:00:00.5Z'),
+            dict(HOSTS[1], modified_timestamp='2021-03-01T00:00:00Z'),
+        ]))
+        assert inventory.watermark == '2021-03-01T00:00:00.5Z'
+
+def test_full_refresh_removes():
+    """ a full refresh drops hosts that have gone """
+    with HostInventory() as inventory:
+        inventory.refresh(InventoryAPI(HOSTS))
+        inventory.refresh(InventoryAPI(HOSTS[:1]), full=True)
+        assert inventory.get('aid2') is None
+        assert len(inventory) == 1
+
+def test_changes():
+    """ only real changes come out, with the fields that changed """
+    with HostInventory() as inventory:
+        assert [event['type'] for event in inventory.changes(InventoryAPI(HOSTS))] == ['added', 'added']
+        moved = dict(HOSTS[0], local_ip='10.0.0.9', last_seen='2021-03-01T00:00:00Z', modified_timestamp='2021-03-01T00:00:00Z')
+        seen = dict(HOSTS[1], last_seen='2021-03-01T00:00:00Z', modified_timestamp='2021-03-01T00:00:00Z')
+        events = list(inventory.changes(InventoryAPI([moved, seen])))
+        assert events == [{
+            'type' : 'changed',
+            'device_id' : 'aid1',
+            'record' : moved,
+            'changed' : {'local_ip' : {'old' : '10.0.0.1', 'new' : '10.0.0.9'}},
+        }]
+        assert inventory.watermark == '2021-03-01T00:00:00Z'
+
+def test_changes_removed():
+    """ removed hosts are found with detect_removed, and the consumer stopping early loses nothing """
+    with HostInventory() as inventory:
+        list(inventory.changes(InventoryAPI(HOSTS)))
+        events = list(inventory.changes(InventoryAPI(HOSTS[:1]), detect_removed=True))
+        assert [(event['type'], event['device_id']) for event in events] == [('removed', 'aid2')]
+        assert events[0]['record'].get('hostname') == 'laptop02'
+        assert len(inventory) == 1
+
+        changed = dict(HOSTS[0], hostname='RENAMED')
+        next(inventory.changes(InventoryAPI([changed])))
+        assert [event['device_id'] for event in inventory.changes(InventoryAPI([changed]))] == ['aid1']
+
+def test_refresh_and_changes_interleaved():
+    """ refresh() and changes() share the watermark and the stored records, so they can be mixed """
+    with HostInventory() as inventory:
+        list(inventory.changes(InventoryAPI(HOSTS)))
+        renamed = dict(HOSTS[0], hostname='RENAMED', modified_timestamp='2021-03-01T00:00:00Z')
+        assert inventory.refresh(InventoryAPI([renamed])) == 1
+        # the refresh already stored the rename, so it's not a change any more
+        api = InventoryAPI([renamed])
+        assert not list(inventory.changes(api))
+        assert api.filters == ["modified_timestamp:>='2021-03-01T00:00:00Z'"]
+
+        moved = dict(renamed, local_ip='10.0.0.9', modified_timestamp='2021-04-01T00:00:00Z')
+        assert inventory.refresh(InventoryAPI([moved, HOSTS[1]]), full=True) == 2
+        events = list(inventory.changes(InventoryAPI([moved]), detect_removed=True))
+        assert [(event['type'], event['device_id']) for event in events] == [('removed', 'aid2')]
+        assert inventory.watermark == '2021-04-01T00:00:00Z'
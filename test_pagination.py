@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+""" tests paginate() and the page walkers, doesn't need API credentials """
+
+import random
+import threading
+import time
+
+import pytest
+
+from crowdstrike.pagination import paginate
+
+class QueryAPI:
+    """ answers hosts_query_devices() offset/limit queries from a list of IDs """
+    def __init__(self, count, total=True, fail_at=None, jitter=0.0, max_limit=None, short_at=None):
+        self.ids = [f"aid{number}" for number in range(count)]
+        self.total = total
+        self.fail_at = fail_at
+        # the server's own page size cap, and an offset that comes back one short
+        self.max_limit = max_limit
+        self.short_at = short_at
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.offsets = []
+
+    def hosts_query_devices(self, **kwargs):
+        """ pretends to be hosts_query_devices() """
+        offset, limit = kwargs.get('offset'), kwargs.get('limit')
+        with self.lock:
+            self.offsets.append(offset)
+        if self.jitter:
+            time.sleep(random.uniform(0, self.jitter))
+        if offset == self.fail_at:
+            return {'resources' : [], 'errors' : [{'code' : 500, 'message' : 'Internal Server Error'}]}
+        if self.max_limit:
+            limit = min(limit, self.max_limit)
+        if offset == self.short_at:
+            limit -= 1
+        page = {'resources' : self.ids[offset:offset + limit], 'meta' : {'pagination' : {'offset' : offset, 'limit' : limit}}}
+        if self.total:
+            page['meta']['pagination']['total'] = len(self.ids)
+        return page
+
+@pytest.mark.parametrize('prefetch', [0, 3])
+def test_paginate_in_order(prefetch):
+    """ pages come out in order, even when later pages come back first """
+    api = QueryAPI(95, jitter=0.02)
+    assert list(paginate(api, 'hosts_query_devices', limit=10, prefetch=prefetch)) == api.ids
+    assert sorted(api.offsets) == list(range(0, 95, 10))
+
+@pytest.mark.parametrize('prefetch', [0, 3])
+def test_paginate_no_total(prefetch):
+    """ without a total, a short page ends it, and a full last page costs one empty request """
+    api = QueryAPI(25, total=False)
+    assert list(paginate(api, 'hosts_query_devices', limit=10, prefetch=prefetch)) == api.ids
+    assert sorted(api.offsets) == [0, 10, 20]
+
+    api = QueryAPI(20, total=False)
+    assert list(paginate(api, 'hosts_query_devices', limit=10, prefetch=prefetch)) == api.ids
+    assert sorted(api.offsets) == [0, 10, 20]
+
+@pytest.mark.parametrize('prefetch', [0, 3])
+def test_paginate_empty(prefetch):
+    """ no results is one request """
+    api = QueryAPI(0)
+    assert not list(paginate(api, 'hosts_query_devices', limit=10, prefetch=prefetch))
+    assert api.offsets == [0]
+
+@pytest.mark.parametrize('prefetch', [0, 3])
+def test_paginate_errors(prefetch):
+    """ a page that fails is raised once the pages before it have been consumed """
+    api = QueryAPI(50, fail_at=20)
+    results = paginate(api, 'hosts_query_devices', limit=10, prefetch=prefetch)
+    assert [next(results) for _ in range(20)] == api.ids[:20]
+    with pytest.raises(RuntimeError):
+        next(results)
+
+@pytest.mark.parametrize('prefetch', [0, 3])
+def test_paginate_short_pages(prefetch):
+    """ short pages that aren't the last one don't lose the results after them """
+    api = QueryAPI(50, max_limit=10)
+    assert list(paginate(api, 'hosts_query_devices', limit=20, prefetch=prefetch)) == api.ids
+    assert sorted(api.offsets) == list(range(0, 50, 10))
+
+    api = QueryAPI(50, short_at=20, jitter=0.01)
+    assert list(paginate(api, 'hosts_query_devices', limit=10, prefetch=prefetch)) == api.ids
+
+def test_paginate_arguments():
+    """ unknown endpoints and oversized pages are refused """
+    with pytest.raises(ValueError):
+        list(paginate(QueryAPI(1), 'hosts_detail'))
+    with pytest.raises(ValueError):
+        list(paginate(QueryAPI(1), 'hosts_query_devices', limit=5001))
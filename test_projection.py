@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+""" tests the field projection, doesn't need API credentials """
+
+import pytest
+
+from crowdstrike.projection import compile_fields, project, project_page
+
+HOST = {
+    'device_id' : 'aid1',
+    'hostname' : 'WORKSTATION01',
+    'local_ip' : '10.0.0.1',
+    'device_policies' : {
+        'prevention' : {'policy_id' : 'p1', 'applied' : True},
+        'sensor_update' : {'policy_id' : 's1'},
+    },
+    'tags' : ['a', 'b'],
+    'behaviors' : [{'tactic' : 'Execution', 'technique' : 'x'}, {'tactic' : 'Persistence'}],
+}
+
+def test_compile_fields():
+    """ a parent field wins over its children, whichever order they're in """
+    assert compile_fields(['a', 'b.c', 'b.d']) == {'a' : {}, 'b' : {'c' : {}, 'd' : {}}}
+    assert compile_fields(['b.c', 'b']) == {'b' : {}}
+    assert compile_fields(['b', 'b.c']) == {'b' : {}}
+    with pytest.raises(TypeError):
+        compile_fields('hostname')
+
+def test_project():
+    """ nested fields, lists of objects and missing fields """
+    tree = compile_fields(['device_id', 'device_policies.prevention.policy_id', 'tags', 'behaviors.tactic', 'missing.field'])
+    assert project(HOST, tree) == {
+        'device_id' : 'aid1',
+        'device_policies' : {'prevention' : {'policy_id' : 'p1'}},
+        'tags' : ['a', 'b'],
+        'behaviors' : [{'tactic' : 'Execution'}, {'tactic' : 'Persistence'}],
+    }
+
+def test_project_page():
+    """ the resources get projected, the rest of the response is left alone """
+    page = project_page({'meta' : {'query_time' : 1}, 'resources' : [HOST], 'errors' : []}, ['hostname'])
+    assert page == {'meta' : {'query_time' : 1}, 'resources' : [{'hostname' : 'WORKSTATION01'}], 'errors' : []}
+    assert project_page(['id1', 'id2'], ['hostname']) == ['id1', 'id2']
+    assert project_page({'resources' : [HOST]}, None) == {'resources' : [HOST]}
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+""" tests the client-side rate limiter, doesn't need API credentials """
+
+import time
+
+from crowdstrike.ratelimit import RateLimiter
+
+def test_learns_limit_from_headers():
+    """ the limit and remaining budget come from the response headers """
+    limiter = RateLimiter(limit=100)
+    limiter.update({'X-RateLimit-Limit' : '600', 'X-RateLimit-Remaining' : '0'})
+    assert limiter.limit == 600
+    assert limiter.tokens == 0
+
+def test_paces_when_empty():
+    """ once the bucket's empty, calls are paced at the refill rate """
+    limiter = RateLimiter(limit=120, window=1.0)
+    for _ in range(int(limiter.burst)):
+        assert limiter.acquire() == 0
+    waited = limiter.acquire()
+    assert waited > 0
+    assert limiter.stats().get('waited_calls') == 1
+
+def test_backoff_on_retry_after():
+    """ a 429 with Retry-After holds requests back """
+    limiter = RateLimiter(limit=6000)
+    delay = limiter.backoff({'Retry-After' : '1'})
+    assert delay == 1
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.9
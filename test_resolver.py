@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+""" tests the hostname/IP resolver, doesn't need API credentials """
+
+import threading
+
+import pytest
+
+from crowdstrike.pagination import paginate
+from crowdstrike.resolver import HostResolver
+
+HOSTS = {
+    'aid1' : {'device_id' : 'aid1', 'hostname' : 'WORKSTATION01', 'local_ip' : '10.0.0.1'},
+    'aid2' : {'device_id' : 'aid2', 'hostname' : 'laptop02', 'local_ip' : '10.0.0.2'},
+    'aid3' : {'device_id' : 'aid3', 'hostname' : 'laptop02', 'local_ip' : '10.0.0.3'},
+}
+
+class ResolverAPI:
+    """ answers hostname/local_ip FQL queries from HOSTS and records the calls """
+    def __init__(self):
+        self.filters = []
+        self.contained = []
+
+    def hosts_query_devices(self, **kwargs):
+        """ handles field:['a','b'] filters """
+        query_filter = kwargs.get('filter')
+        if not kwargs.get('offset'):
+            # one per lookup, not per page
+            self.filters.append(query_filter)
+        field, values = query_filter.split(':', 1)
+        values = [value.strip("'").lower() for value in values.strip('[]').split(',')]
+        matching = [aid for aid, host in HOSTS.items() if host.get(field).lower() in values]
+        offset, limit = kwargs.get('offset', 0), kwargs.get('limit', 5000)
+        return {'resources' : matching[offset:offset + limit], 'meta' : {'pagination' : {'total' : len(matching)}}}
+
+    def paginate(self, endpoint, **kwargs):
+        """ the real paginate(), one host per page so a lookup takes more than one """
+        return paginate(self, endpoint, limit=1, **kwargs)
+
+    def hosts_detail(self, **kwargs):
+        """ returns the projected hosts """
+        return {'resources' : [{field : HOSTS[aid].get(field) for field in kwargs.get('fields')} for aid in kwargs.get('ids')]}
+
+    def host_action_bulk(self, **kwargs):
+        """ records the containment """
+        self.contained.extend(kwargs.get('actions').get('contain'))
+        return {'contain' : dict.fromkeys(kwargs.get('actions').get('contain'))}
+
+def test_resolve_batches_and_caches():
+    """ one query for every uncached value, and not-found answers are cached too """
+    api = ResolverAPI()
+    resolver = HostResolver(api)
+    result = resolver.resolve_hostnames(['workstation01', 'LAPTOP02', 'nothere', 'Workstation01'])
+    assert result == {'workstation01' : ['aid1'], 'LAPTOP02' : ['aid2', 'aid3'], 'nothere' : [], 'Workstation01' : ['aid1']}
+    assert api.filters == ["hostname:['workstation01','LAPTOP02','nothere']"]
+
+    assert resolver.resolve_hostnames(['nothere', 'laptop02']) == {'nothere' : [], 'laptop02' : ['aid2', 'aid3']}
+    assert len(api.filters) == 1
+    assert resolver.stats().get('hits') == 2
+
+    resolver.forget('hostname', 'nothere')
+    resolver.resolve_hostnames(['nothere'])
+    assert len(api.filters) == 2
+
+def test_resolve_ips():
+    """ IPs work the same way, and bad fields are refused """
+    resolver = HostResolver(ResolverAPI())
+    assert resolver.resolve_ips(['10.0.0.3']) == {'10.0.0.3' : ['aid3']}
+    with pytest.raises(ValueError):
+        resolver.resolve('os_version', ['Windows 10'])
+
+def test_contain_hostnames():
+    """ resolves and contains in one call, unknown hostnames are reported """
+    api = ResolverAPI()
+    result = HostResolver(api).contain_hostnames(['laptop02', 'typo'])
+    assert api.contained == ['aid2', 'aid3']
+    assert result.get('unresolved') == ['typo']
+    assert result.get('results') == {'aid2' : None, 'aid3' : None}
+
+def test_resolve_counters_threaded():
+    """ lookups from lots of threads are all counted """
+    resolver = HostResolver(ResolverAPI())
+    resolver.resolve_hostnames(['laptop02'])
+    threads = [threading.Thread(target=lambda: [resolver.resolve_hostnames(['laptop02']) for _ in range(200)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert resolver.stats().get('hits') == 1600
+    assert resolver.stats().get('misses') == 1
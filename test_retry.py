@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+""" tests the retry policy, doesn't need API credentials """
+
+import time
+
+from requests.exceptions import ConnectTimeout, ReadTimeout
+
+from crowdstrike import CrowdstrikeAPI
+from crowdstrike.retry import RetryPolicy
+
+class RateLimitedResponse: # pylint: disable=too-few-public-methods
+    """ a 429 that says to come back in a minute """
+    status_code = 429
+    headers = {'Retry-After' : '60'}
+
+def test_idempotency():
+    """ reads and POST /GET/ lookups are safe to replay, actions aren't """
+    policy = RetryPolicy()
+    assert policy.is_idempotent('get', '/devices/queries/devices/v1')
+    assert policy.is_idempotent('post', '/detects/entities/summaries/GET/v1')
+    assert not policy.is_idempotent('post', '/devices/entities/devices-actions/v2')
+    assert not policy.is_idempotent('post', '/incidents/entities/incident-actions/v1')
+    assert RetryPolicy(safe_uris=['/real-time-response/entities/sessions/v1']).is_idempotent('post', '/real-time-response/entities/sessions/v1')
+
+def test_retry_responses():
+    """ 5xx on a read gets retried, on an action it doesn't """
+    policy = RetryPolicy(backoff_base=0.01)
+    started = time.monotonic()
+    assert policy.retry_response('get', '/devices/queries/devices/v1', 503, 0, started) is not None
+    assert policy.retry_response('get', '/devices/queries/devices/v1', 400, 0, started) is None
+    assert policy.retry_response('post', '/devices/entities/devices-actions/v2', 503, 0, started) is None
+    assert policy.retry_response('get', '/devices/queries/devices/v1', 503, policy.max_retries, started) is None
+    assert policy.stats().get('total_retries') == 1
+
+def test_retry_errors():
+    """ an action's only retried if it never reached the server """
+    policy = RetryPolicy(backoff_base=0.01)
+    started = time.monotonic()
+    assert policy.retry_error('post', '/devices/entities/devices-actions/v2', ConnectTimeout(), 0, started) is not None
+    assert policy.retry_error('post', '/devices/entities/devices-actions/v2', ReadTimeout(), 0, started) is None
+    assert policy.retry_error('get', '/devices/queries/devices/v1', ReadTimeout(), 0, started) is not None
+
+def test_deadline():
+    """ nothing gets retried past the deadline """
+    policy = RetryPolicy(deadline=1.0)
+    assert policy.retry_response('get', '/devices/queries/devices/v1', 503, 0, time.monotonic() - 5) is None
+    assert policy.timeout(time.monotonic()) <= 1.0
+
+def test_rate_limit_deadline():
+    """ a 429 isn't waited out if that'd run past the deadline, the 429's returned instead """
+    policy = RetryPolicy(deadline=1.0)
+    assert policy.retry_rate_limited('get', '/devices/queries/devices/v1', 0.1, time.monotonic())
+    assert not policy.retry_rate_limited('get', '/devices/queries/devices/v1', 60, time.monotonic())
+
+    crowdstrike = CrowdstrikeAPI('client_id', 'client_secret', lazy_auth=True, retry_policy=policy)
+    crowdstrike.ensure_token = lambda: {'access_token' : 'token'}
+    sent = []
+    crowdstrike.do_request = lambda **kwargs: sent.append(kwargs) or RateLimitedResponse()
+    started = time.monotonic()
+    assert crowdstrike.request(uri='/devices/queries/devices/v1', request_method='get').status_code == 429
+    assert time.monotonic() - started < 1.0
+    assert len(sent) == 1
+    assert policy.stats().get('gave_up') == 2
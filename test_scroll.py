@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+""" tests the scroll host ID producer and iter_hosts() hydration, doesn't need API credentials """
+
+import threading
+import time
+
+import pytest
+
+from crowdstrike import hosts
+
+class ScrollAPI:
+    """ answers hosts_query_devices_scroll() a page at a time from a list of IDs """
+    def __init__(self, count, fail_on_page=None):
+        self.ids = [f"aid{number}" for number in range(count)]
+        self.fail_on_page = fail_on_page
+        self.lock = threading.Lock()
+        self.scroll_calls = 0
+        self.detail_calls = 0
+
+    def hosts_query_devices_scroll(self, **kwargs):
+        """ pretends to be hosts_query_devices_scroll(), the cursor's the page number """
+        with self.lock:
+            self.scroll_calls += 1
+        page = int(kwargs.get('offset', 'c0')[1:])
+        if page == self.fail_on_page:
+            return {'resources' : [], 'errors' : [{'code' : 400, 'message' : 'scroll cursor expired'}]}
+        start = page * kwargs.get('limit')
+        resources = self.ids[start:start + kwargs.get('limit')]
+        return {'resources' : resources, 'meta' : {'pagination' : {'offset' : f"c{page + 1}", 'total' : len(self.ids)}}}
+
+    def scroll_host_ids(self, **kwargs):
+        """ the real scroll_host_ids(), on this fake """
+        return hosts.scroll_host_ids(self, **kwargs)
+
+    def hosts_detail(self, **kwargs):
+        """ pretends to be hosts_detail() """
+        with self.lock:
+            self.detail_calls += 1
+        return {'resources' : [{'device_id' : host_id} for host_id in kwargs.get('ids')]}
+
+def scroll_thread_running() -> bool:
+    """ waits a little while for the producer thread to finish, returns True if it's still going """
+    for _ in range(30):
+        if not any(thread.name == 'crowdstrike-scroll' for thread in threading.enumerate()):
+            return False
+        time.sleep(0.1)
+    return True
+
+def test_scroll_host_ids():
+    """ every ID comes out once, in order, and the last short page ends it """
+    api = ScrollAPI(25)
+    assert list(hosts.scroll_host_ids(api, limit=10)) == api.ids
+    assert api.scroll_calls == 3
+
+def test_scroll_renews_cursor(monkeypatch):
+    """ a slow consumer gets the cursor renewed, up to SCROLL_MAX_WAITING_PAGES held pages """
+    monkeypatch.setattr(hosts, 'SCROLL_CURSOR_RENEW_AFTER', 0.05)
+    monkeypatch.setattr(hosts, 'SCROLL_MAX_WAITING_PAGES', 2)
+    api = ScrollAPI(20)
+    host_ids = hosts.scroll_host_ids(api, limit=1)
+    assert next(host_ids) == 'aid0'
+    time.sleep(0.5)
+    # the page being consumed, SCROLL_BUFFER_PAGES in the queue, then two held while renewing
+    assert api.scroll_calls == 1 + hosts.SCROLL_BUFFER_PAGES + 2
+    assert list(host_ids) == api.ids[1:]
+
+def test_scroll_errors():
+    """ an error fetching a page is raised to the consumer, after the pages before it """
+    api = ScrollAPI(30, fail_on_page=2)
+    host_ids = hosts.scroll_host_ids(api, limit=10)
+    assert [next(host_ids) for _ in range(20)] == api.ids[:20]
+    with pytest.raises(RuntimeError):
+        next(host_ids)
+    assert not scroll_thread_running()
+
+def test_scroll_stop_early():
+    """ the producer stops when the consumer does """
+    api = ScrollAPI(1000)
+    host_ids = hosts.scroll_host_ids(api, limit=1)
+    assert next(host_ids) == 'aid0'
+    host_ids.close()
+    assert not scroll_thread_running()
+    assert api.scroll_calls < 10
+
+def test_iter_hosts_backpressure():
+    """ no more than max_pending batches are hydrated ahead of the consumer """
+    api = ScrollAPI(50)
+    records = hosts.iter_hosts(api, batch_size=5, workers=2, max_pending=2)
+    assert next(records) == {'device_id' : 'aid0'}
+    time.sleep(0.2)
+    assert api.detail_calls == 2
+    assert [record['device_id'] for record in records] == api.ids[1:]
+    assert api.detail_calls == 10
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+""" tests the columnar fleet snapshot, doesn't need API credentials """
+
+import datetime
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from crowdstrike.snapshot import FleetSnapshot # pylint: disable=wrong-import-position
+
+HOSTS = [
+    {
+        'device_id' : 'a' * 32,
+        'hostname' : 'WORKSTATION01',
+        'platform_name' : 'Windows',
+        'os_version' : 'Windows 10',
+        'agent_version' : '6.30.14406.0',
+        'last_seen' : '2021-03-01T00:00:00Z',
+    },
+    {
+        'device_id' : 'b' * 32,
+        'hostname' : 'laptop02',
+        'platform_name' : 'Mac',
+        'os_version' : 'Big Sur (11.0)',
+        'agent_version' : '6.29.14203.0',
+        'last_seen' : '2021-01-01T00:00:00.123456Z',
+    },
+    {
+        'device_id' : 'c' * 32,
+        'hostname' : 'server03',
+        'platform_name' : 'Windows',
+        'os_version' : 'Windows Server 2019',
+        'agent_version' : '6.9.12345.0',
+    },
+]
+
+class SnapshotAPI: # pylint: disable=too-few-public-methods
+    """ hands back canned hosts and records the host actions """
+    def __init__(self):
+        self.actions = []
+
+    def iter_hosts(self, **kwargs): # pylint: disable=unused-argument
+        """ yields the canned hosts """
+        yield from HOSTS
+
+    def host_action_bulk(self, **kwargs):
+        """ records the actions """
+        self.actions.append(kwargs)
+        return {action_name : dict.fromkeys(ids) for action_name, ids in kwargs['actions'].items()}
+
+def test_snapshot_columns():
+    """ builds from pages and checks the encoding round trips """
+    snapshot = FleetSnapshot.from_pages([{'resources' : HOSTS[:2]}, HOSTS[2:]])
+    assert len(snapshot) == 3
+    assert snapshot.codes['platform_name'].dtype == numpy.int32
+    assert snapshot.categories['platform_name'] == ['Windows', 'Mac']
+    assert list(snapshot.column('hostname')) == ['WORKSTATION01', 'laptop02', 'server03']
+    assert list(snapshot.column('site_name')) == [None, None, None]
+    assert numpy.isnat(snapshot.column('last_seen')[2])
+    assert snapshot.ids() == [host['device_id'] for host in HOSTS]
+
+def test_snapshot_analytics():
+    """ filters, counts and the stale/version selections """
+    snapshot = FleetSnapshot.from_client(SnapshotAPI())
+    assert snapshot.count_by('platform_name') == {'Windows' : 2, 'Mac' : 1}
+    windows = snapshot.equals('platform_name', 'Windows')
+    assert snapshot.ids(windows) == ['a' * 32, 'c' * 32]
+    assert not snapshot.equals('platform_name', 'Linux').any()
+    assert snapshot.filter(windows).count_by('os_version') == {'Windows 10' : 1, 'Windows Server 2019' : 1}
+
+    stale = snapshot.stale(days=30, now=datetime.datetime(2021, 3, 2))
+    assert snapshot.ids(stale) == ['b' * 32, 'c' * 32]
+    # 6.9 is older than 6.29, it's not a string comparison
+    assert snapshot.ids(snapshot.versions_behind()) == ['b' * 32, 'c' * 32]
+    assert snapshot.ids(snapshot.versions_behind('6.29.0.0')) == ['c' * 32]
+
+def test_snapshot_host_action():
+    """ the selected IDs go to host_action_bulk """
+    api = SnapshotAPI()
+    snapshot = FleetSnapshot.from_client(api)
+    result = snapshot.host_action(api, 'hide_host', snapshot.equals('platform_name', 'Mac'))
+    assert api.actions == [{'actions' : {'hide_host' : ['b' * 32]}}]
+    assert result == {'b' * 32 : None}
+    assert snapshot.host_action(api, 'hide_host', snapshot.equals('platform_name', 'Linux')) == {}
+
+def test_snapshot_empty():
+    """ no hosts is fine too """
+    snapshot = FleetSnapshot.from_pages([])
+    assert len(snapshot) == 0
+    assert snapshot.count_by('hostname') == {}
+    assert snapshot.ids(snapshot.stale()) == []
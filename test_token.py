@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+""" tests the single-flight token refresh, doesn't need API credentials """
+
+import threading
+import time
+
+from crowdstrike import CrowdstrikeAPI
+
+THREADS = 10
+
+class TokenResponse: # pylint: disable=too-few-public-methods
+    """ just enough of a requests.Response for _send() """
+    headers = {}
+
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        """ nothing gets this far with an error in these tests """
+        assert self.status_code == 200
+
+def fetching_client(token: dict) -> tuple:
+    """ returns a client that starts with token, and the list its token fetches get recorded in """
+    crowdstrike = CrowdstrikeAPI('client_id', 'client_secret', lazy_auth=True)
+    crowdstrike.token = token
+    fetches = []
+
+    def fetch_token(token_url):
+        fetches.append(token_url)
+        # slow enough that the other threads pile up behind it
+        time.sleep(0.1)
+        crowdstrike.token = {'access_token' : 'new', 'expires_at' : time.time() + 1800}
+        return crowdstrike.token
+    crowdstrike._fetch_token = fetch_token # pylint: disable=protected-access
+    return crowdstrike, fetches
+
+def run_threads(target) -> list:
+    """ runs target in THREADS threads at once, returns what they returned """
+    barrier = threading.Barrier(THREADS)
+    results = [None] * THREADS
+
+    def run(index):
+        barrier.wait(5)
+        results[index] = target()
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+def test_expiring_token_fetched_once():
+    """ threads that all see the token's about to expire only fetch one new one """
+    crowdstrike, fetches = fetching_client({'access_token' : 'old', 'expires_at' : time.time() + 1})
+    tokens = run_threads(crowdstrike.ensure_token)
+    assert len(fetches) == 1
+    assert [token.get('access_token') for token in tokens] == ['new'] * THREADS
+
+def test_401_fetched_once():
+    """ threads that all get a 401 only fetch one new token, and each replays its request once """
+    crowdstrike, fetches = fetching_client({'access_token' : 'old', 'expires_at' : time.time() + 1800})
+    rejected = threading.Barrier(THREADS)
+    sent = []
+
+    def do_request(**kwargs):
+        access_token = kwargs.get('token').get('access_token')
+        sent.append(access_token)
+        if access_token == 'old':
+            # every thread gets its 401 before any of them refresh
+            rejected.wait(5)
+            return TokenResponse(401)
+        return TokenResponse(200)
+    crowdstrike.do_request = do_request
+    responses = run_threads(lambda: crowdstrike.request(uri='/devices/queries/devices/v1', request_method='get'))
+    assert [response.status_code for response in responses] == [200] * THREADS
+    assert len(fetches) == 1
+    assert sorted(sent) == ['new'] * THREADS + ['old'] * THREADS
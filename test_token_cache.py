@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+""" tests the on-disk token cache, doesn't need API credentials """
+
+import os
+import stat
+import tempfile
+import time
+
+from crowdstrike.token_cache import TokenCache
+
+BASEURL = "https://api.crowdstrike.com"
+
+def test_store_and_load():
+    """ a stored token comes back until it's close to expiring """
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = TokenCache(path=tempdir)
+        token = {'access_token' : 'abc123', 'expires_at' : time.time() + 1800}
+        with cache.lock('client_id', BASEURL):
+            cache.store('client_id', BASEURL, token)
+        assert cache.load('client_id', BASEURL, min_ttl=60) == token
+        assert cache.load('client_id', BASEURL, min_ttl=3600) is None
+        # keyed by the base URL too
+        assert cache.load('client_id', "https://api.us-2.crowdstrike.com") is None
+
+def test_permissions():
+    """ only the owner can read the cached token """
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = TokenCache(path=tempdir)
+        cache.store('client_id', BASEURL, {'access_token' : 'abc123', 'expires_at' : time.time() + 1800})
+        for filename in os.listdir(tempdir):
+            mode = stat.S_IMODE(os.stat(os.path.join(tempdir, filename)).st_mode)
+            assert mode & 0o077 == 0
+
+def test_delete():
+    """ deleting a token that isn't there is fine """
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = TokenCache(path=tempdir)
+        cache.delete('client_id', BASEURL)
+        cache.store('client_id', BASEURL, {'access_token' : 'abc123', 'expires_at' : time.time() + 1800})
+        cache.delete('client_id', BASEURL)
+        assert cache.load('client_id', BASEURL) is None
@@ -19,12 +19,14 @@ logger.debug(dir(CrowdstrikeAPI))
 for function_name in [ fname for fname in dir(CrowdstrikeAPI) if not fname.startswith('_')]:
     logger.debug(f"Checking function {function_name}")
     target_function = getattr(CrowdstrikeAPI,function_name)
+    if isinstance(target_function, property):
+        continue
 
     target_uri = False #pylint: disable=invalid-name
     target_method = False #pylint: disable=invalid-name
     SOURCE_CODE = inspect.getsource(target_function)
     # some functions don't use requests, but most should
-    SKIP_OAUTH_REQUEST_CHECK = ('request', 'do_request', 'get_token', 'revoke_token')
+    SKIP_OAUTH_REQUEST_CHECK = ('request', 'do_request', 'get_token', 'revoke_token', 'token_needs_refresh', 'refresh_token', 'ensure_token', 'configure_connection_pool', 'paginate', 'scroll_host_ids', 'iter_hosts', 'host_action_bulk', 'backfill_detects')
     if 'do_request' not in SOURCE_CODE and 'self.request' not in SOURCE_CODE and function_name not in SKIP_OAUTH_REQUEST_CHECK and 'NotImplementedError' not in SOURCE_CODE:
         logger.warning(f"do_request or request call not in {function_name}()")
         #logger.warning(SOURCE_CODE)